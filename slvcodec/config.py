@@ -1,10 +1,40 @@
 import logging
 import os
 
+import jinja2
 from vunit import VUnitCLI, VUnit
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 vhdldir = os.path.join(basedir, 'vhdl')
+templatedir = os.path.join(basedir, 'templates')
+
+# If set, parsed VHDL files are pickled into this directory so that files that have not
+# changed are not parsed again in later runs.
+parse_cache_directory = None
+
+
+def make_template_bytecode_cache():
+    '''
+    Create a cache so that compiled templates are reused between runs.
+    Uses jinja's per-user temporary directory.  If that directory can't be
+    used then there is no cache and the templates are compiled on every run.
+    '''
+    try:
+        bytecode_cache = jinja2.FileSystemBytecodeCache(pattern='__slvcodec_jinja2_%s.cache')
+    except RuntimeError:
+        bytecode_cache = None
+    return bytecode_cache
+
+
+# Shared by all the generators so that each template is only read and compiled once.
+# The templates are part of the package and are not edited while running so there is
+# no need to check whether they have changed.
+template_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(templatedir),
+    cache_size=-1,
+    auto_reload=False,
+    bytecode_cache=make_template_bytecode_cache(),
+    )
 
 
 def setup_logging(level):
@@ -1,3 +1,5 @@
+import collections
+import heapq
 import logging
 
 
@@ -20,50 +22,64 @@ def resolve_dependencies(available, unresolved, dependencies, resolve_function):
     '''
     updated_available = available.copy()
     unresolved_names = list(unresolved.keys())
-    available_names = list(available.keys())
-    assert not set(unresolved_names) & set(available_names)
+    available_names = set(available.keys())
+    assert not set(unresolved_names) & available_names
+    positions = {name: index for index, name in enumerate(unresolved_names)}
+    # For each item the dependencies that are still missing, and for each
+    # item the items that are waiting on it.
+    missing_dependencies = {}
+    dependents = collections.defaultdict(list)
+    for name in unresolved_names:
+        missing = set(dependencies[name]) - available_names
+        missing_dependencies[name] = missing
+        for dependency in missing:
+            dependents[dependency].append(name)
     resolved = {}
     failed = {}
-    failed_names = []
-    while unresolved_names:
-        any_changes = False
-        for unresolved_name in unresolved_names:
-            unresolved_item = unresolved[unresolved_name]
-            item_dependencies = dependencies[unresolved_name]
-            if set(item_dependencies) & set(failed_names):
-                any_changes = True
-                # Cannot resolve this since a dependency has failed.
-                failed[unresolved_name] = unresolved_item
-                failed_names.append(unresolved_name)
-            elif not set(item_dependencies) - set(available_names):
-                any_changes = True
-                failed_to_resolve = False
-                try:
-                    resolved_item = resolve_function(
-                        unresolved_name, unresolved_item, updated_available)
-                except Exception:
-                    logger.error('Failed to resolve %s.  Error caught when resolving.',
-                                 unresolved_name)
-                    failed[unresolved_name] = unresolved_item
-                    failed_names.append(unresolved_name)
-                    failed_to_resolve = True
-                if not failed_to_resolve:
-                    assert unresolved_name not in resolved
-                    resolved[unresolved_name] = resolved_item
-                    assert unresolved_name not in updated_available
-                    updated_available[unresolved_name] = resolved_item
-                    assert unresolved_name not in available_names
-                    available_names.append(unresolved_name)
-        if not any_changes:
-            logger.debug('Failed to resolve %s', str(unresolved_names))
-            for unresolved_name in unresolved_names:
-                unresolved_item = unresolved[unresolved_name]
-                logger.debug(
-                    '%s was missing the dependencies: %s',
-                    unresolved_name,
-                    str(set(dependencies[unresolved_name]) - set(available_names)))
-                failed[unresolved_name] = unresolved_item
-                failed_names.append(unresolved_name)
-        unresolved_names = list(set(unresolved_names) - set(available_names) -
-                                set(failed_names))
+    # Items are resolved in the same order as repeatedly sweeping through the
+    # unresolved items and resolving whatever is ready.  An item that becomes
+    # ready is resolved in the current sweep if it comes later in the list,
+    # otherwise in the next one.
+    ready = [(0, positions[name]) for name in unresolved_names
+             if not missing_dependencies[name]]
+    heapq.heapify(ready)
+    while ready:
+        sweep, position = heapq.heappop(ready)
+        unresolved_name = unresolved_names[position]
+        unresolved_item = unresolved[unresolved_name]
+        del missing_dependencies[unresolved_name]
+        try:
+            resolved_item = resolve_function(
+                unresolved_name, unresolved_item, updated_available)
+        except Exception:
+            logger.error('Failed to resolve %s.  Error caught when resolving.',
+                         unresolved_name)
+            # Anything depending on this item cannot be resolved either.
+            to_fail = [unresolved_name]
+            while to_fail:
+                failed_name = to_fail.pop()
+                failed[failed_name] = unresolved[failed_name]
+                for dependent in dependents[failed_name]:
+                    if dependent in missing_dependencies:
+                        del missing_dependencies[dependent]
+                        to_fail.append(dependent)
+            continue
+        assert unresolved_name not in resolved
+        resolved[unresolved_name] = resolved_item
+        assert unresolved_name not in updated_available
+        updated_available[unresolved_name] = resolved_item
+        available_names.add(unresolved_name)
+        for dependent in dependents[unresolved_name]:
+            if dependent in missing_dependencies:
+                missing = missing_dependencies[dependent]
+                missing.discard(unresolved_name)
+                if not missing:
+                    dependent_position = positions[dependent]
+                    dependent_sweep = sweep if dependent_position > position else sweep + 1
+                    heapq.heappush(ready, (dependent_sweep, dependent_position))
+    if missing_dependencies:
+        logger.debug('Failed to resolve %s', str(list(missing_dependencies.keys())))
+        for unresolved_name, missing in missing_dependencies.items():
+            logger.debug('%s was missing the dependencies: %s', unresolved_name, str(missing))
+            failed[unresolved_name] = unresolved[unresolved_name]
     return resolved, failed
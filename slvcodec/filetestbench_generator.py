@@ -1,12 +1,68 @@
+import collections
+import concurrent.futures
+import functools
 import logging
 import os
+import pathlib
 
-import jinja2
-
-from slvcodec import entity, typs, package_generator, config, vhdl_parser
+from slvcodec import entity, typs, package_generator, config, vhdl_parser, generator_utils
 
 logger = logging.getLogger(__name__)
 
+# The testbench signal that each port is connected to, based on the port direction.
+DIRECTION_TO_RECORD_SIGNAL = {'in': 'input_data', 'out': 'output_data'}
+
+
+EntityFragments = collections.namedtuple('EntityFragments', [
+    'wrapped_generics', 'entity_generics', 'wrapper_use_clauses', 'testbench_use_clauses',
+    'ports'])
+
+
+@functools.lru_cache(maxsize=256)
+def _entity_fragments(enty):
+    """
+    Generate the pieces of the wrappers and testbenches that depend only on the entity.
+    Sweeps call the generators many times for the same entity with different generics,
+    so these are cached on the entity object.  Entities hash by identity, so the cache
+    is bounded to stop entities from repeated parses piling up.
+    """
+    # Get the list of generic parameters for the wrapped entity.
+    wrapped_generics = ',\n'.join(f'{g.name} => {g.name}' for g in enty.generics.values())
+    entity_generics = ';\n'.join(f'{g.name}: {g.typ}' for g in enty.generics.values())
+    # Use clauses for wrappers that sit between the entity and the slvcodec conversions.
+    wrapper_use_clauses = generator_utils.make_wrapper_use_clauses(enty)
+    # Use clauses for testbenches and the double wrapper.
+    testbench_use_clauses = generator_utils.compute_use_clauses(
+        generator_utils.uses_as_tuples(enty), excluded_slvcodec_design_units=('slvcodec',))
+    return EntityFragments(
+        wrapped_generics=wrapped_generics,
+        entity_generics=entity_generics,
+        wrapper_use_clauses=wrapper_use_clauses,
+        testbench_use_clauses=testbench_use_clauses,
+        ports=tuple(enty.ports.values()),
+        )
+
+
+def make_record_and_conversions(identifier, names_and_subtypes):
+    """
+    Create a record type along with the declarations and definitions of the functions
+    that convert it to and from std_logic_vector.
+    `names_and_subtypes` is a tuple of (name, subtype) pairs.
+    """
+    record = typs.Record(identifier, list(names_and_subtypes))
+    slv_declarations, slv_definitions = (
+        package_generator.make_record_declarations_and_definitions(record))
+    return record, slv_declarations, slv_definitions
+
+
+@functools.lru_cache(maxsize=256)
+def _record_and_conversions(identifier, names_and_subtypes):
+    """
+    Cached `make_record_and_conversions`.  Types hash by identity so generating a
+    testbench again for the same entity reuses the earlier result.
+    """
+    return make_record_and_conversions(identifier, names_and_subtypes)
+
 
 def make_generics_wrapper(enty, generics, wrapped_name, ports_to_remove=None, for_arch_header='',
                           slv_interface=True):
@@ -21,48 +77,30 @@ def make_generics_wrapper(enty, generics, wrapped_name, ports_to_remove=None, fo
       `for_arch_header`: Text placed at the top of the architecture.  Used for encryption headers.
       `slv_interface`: Convert all ports to std_logic_vector and std_logic in the wrapper's ports.
     """
-    if ports_to_remove is None:
-        ports_to_remove = []
+    ports_to_remove = frozenset(ports_to_remove or ())
     if for_arch_header is None:
         for_arch_header = ''
-    generics = generics.copy()
-    for k, v in generics.items():
-        if isinstance(v, str) and (len(v) > 0) and (v[0] not in  ("'", '"')):
-            generics[k] = '"' + v + '"'
-    # Get the list of generic parameters for the testbench.
-    wrapped_generics = ',\n'.join(['{} => {}'.format(g.name, g.name)
-                                   for g in enty.generics.values()])
-    # Generate use clauses required by the testbench.
-    use_clauses = '\n'.join([
-        'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values() if (u.design_unit not in ('std_logic_1164', 'slvcodec')) and 
-                                       ('_slvcodec' not in u.design_unit)])
-    use_clauses += '\n' + '\n'.join([
-        'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()
-        if u.library not in ('ieee', 'std') and '_slvcodec' not in u.design_unit])
+    generics = generator_utils.quote_generics(generics)
+    fragments = _entity_fragments(enty)
+    use_clauses = fragments.wrapper_use_clauses
     # Read in the template and format it.
     if slv_interface:
         template_name = 'setgenerics.vhd'
     else:
         template_name = 'setgenerics_not_slv.vhd'
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-    with open(template_fn, 'r') as f:
-        template = jinja2.Template(f.read())
+    template = config.template_env.get_template(template_name)
     wrapper = template.render(
         entity_name=enty.identifier,
         use_clauses=use_clauses,
-        wrapped_generics=wrapped_generics,
+        wrapped_generics=fragments.wrapped_generics,
         wrapped_name=enty.identifier,
         wrapper_name=wrapped_name,
-        wrapped_ports=list(enty.ports.values()),
-        wrapper_ports=list([e for e in enty.ports.values() if e.name not in ports_to_remove]),
+        wrapped_ports=fragments.ports,
+        wrapper_ports=[e for e in fragments.ports if e.name not in ports_to_remove],
         for_arch_header=for_arch_header,
         )
     template_name = 'setgenerics_pkg.vhd'
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-    with open(template_fn, 'r') as f:
-        template = jinja2.Template(f.read())
+    template = config.template_env.get_template(template_name)
     constant_generics = [
         (g.name, str(g.typ), generics[g.name])
         for g in enty.generics.values()]
@@ -73,7 +111,7 @@ def make_generics_wrapper(enty, generics, wrapped_name, ports_to_remove=None, fo
     return wrapper, package
 
 
-def make_double_wrapper(enty, default_generics=None):
+def make_double_wrapper(enty, default_generics=None, output_filenames=None):
     """
     Create a two wrappers around an entity.
     The first wrapper converts all the ports to std_logic_vector and std_logic.
@@ -83,54 +121,30 @@ def make_double_wrapper(enty, default_generics=None):
     Args:
       `enty`: A resolved entity object parsed from the VHDL.
       `default_generics`: A dictionary of generics to set as default in the wrappers.
+      `output_filenames`: An optional pair of filenames.  If given, the fromslvcodec and
+          toslvcodec wrappers are written to these files rather than returned.
     """
-    if default_generics is None:
-        default_generics = {}
-    else:
-        default_generics = default_generics.copy()
-    for k, v in default_generics.items():
-        if isinstance(v, str) and (len(v) > 0) and (v[0] != "'"):
-            default_generics[k] = '"' + v + '"'
-    # Get the list of generic parameters for the testbench.
-    entity_generics = ';\n'.join(['{}: {}'.format(g.name, g.typ)
-                                  for g in enty.generics.values()])
-    entity_generics_with_defaults = []
-    for g in enty.generics.values():
-        as_str = '{}: {}'.format(g.name, g.typ)
-        if g.name in default_generics:
-            as_str += ' := {}'.format(default_generics[g.name])
-        as_str += ';'
-        entity_generics_with_defaults.append(as_str)
-    entity_generics_with_defaults = '\n'.join(entity_generics_with_defaults)[:-1]
-    wrapped_generics = ',\n'.join(['{} => {}'.format(g.name, g.name)
-                                   for g in enty.generics.values()])
-    # Generate use clauses required by the testbench.
-    use_clauses = '\n'.join([
-        'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()])
-    use_clauses += '\n' + '\n'.join([
-        'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()
-        if u.library not in ('ieee', 'std') and ('_slvcodec' not in u.design_unit) and
-        (u.design_unit != 'slvcodec')])
+    if output_filenames is None:
+        output_filenames = (None, None)
+    fragments = _entity_fragments(enty)
+    entity_generics_with_defaults = make_generic_params(enty, default_generics)
     # Read in the toslvcodec template and format it.
     template_and_wrapped_names = (
         ('fromslvcodec.vhd', enty.identifier),
         ('toslvcodec.vhd', enty.identifier + '_fromslvcodec'),
         )
     wrappers = []
-    for template_name, wrapped_name in template_and_wrapped_names:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-        with open(template_fn, 'r') as f:
-            template = jinja2.Template(f.read())
-        wrappers.append(template.render(
+    for (template_name, wrapped_name), output_filename in zip(
+            template_and_wrapped_names, output_filenames):
+        wrappers.append(generator_utils.render_template(
+            template_name, output_filename,
             entity_name=enty.identifier,
-            entity_generics=entity_generics,
+            entity_generics=fragments.entity_generics,
             entity_generics_with_defaults=entity_generics_with_defaults,
-            use_clauses=use_clauses,
-            wrapped_generics=wrapped_generics,
+            use_clauses=fragments.testbench_use_clauses,
+            wrapped_generics=fragments.wrapped_generics,
             wrapped_name=wrapped_name,
-            ports=list(enty.ports.values()),
+            ports=fragments.ports,
             ))
     return wrappers
 
@@ -153,7 +167,7 @@ def typ_to_slv(typ):
 def make_filetestbench(enty, add_double_wrapper=False, use_vunit=True,
                        default_output_path=None, default_generics=None,
                        use_pipes=False, slv_interface=False, dut_name=None,
-                       extra_definitions='', extra_logic='',
+                       extra_definitions='', extra_logic='', output_filename=None,
                        ):
     '''
     Generate a testbench that reads inputs from a file, and writes outputs to
@@ -171,59 +185,49 @@ def make_filetestbench(enty, add_double_wrapper=False, use_vunit=True,
          accept std_logic and std_logic_vector.  Also assumes generics have been removed.
       `dut_name`: The name that will be used to instantiate the dut (might be different
                        to enty.identifier if wrappers are involved).
+      `output_filename`: If given, the testbench is written to this file rather than returned.
     '''
-    if default_generics is None:
-        default_generics = {}
-    else:
-        default_generics = default_generics.copy()
-    for k, v in default_generics.items():
-        if isinstance(v, str) and (len(v) > 0) and (v[0] != "'"):
-            default_generics[k] = '"' + v + '"'
-    # Generate a record type for the entity inputs (excluding clock).
-    inputs = [p for p in enty.ports.values()
-              if p.direction == 'in' and p.name not in entity.CLOCK_NAMES]
+    # Sort the ports into inputs (excluding clock), outputs and clocks, and connect
+    # the inputs and outputs to the testbench records.
+    inputs = []
+    outputs = []
+    clk_names = []
+    connections = []
+    for p in enty.ports.values():
+        if p.direction == 'in':
+            if p.name in entity.CLOCK_NAMES:
+                clk_names.append(p.name)
+                continue
+            inputs.append(p)
+        elif p.direction == 'out':
+            outputs.append(p)
+        connections.append(f'{p.name} => {DIRECTION_TO_RECORD_SIGNAL[p.direction]}.{p.name}')
+    assert len(clk_names) in (0, 1)
+    # Generate record types for the entity inputs and outputs.
     if slv_interface:
         input_names_and_types = [(p.name, typ_to_slv(p.typ)) for p in inputs]
-    else:
-        input_names_and_types = [(p.name, p.typ) for p in inputs]
-    input_record = typs.Record('t_input', input_names_and_types)
-    # Generate a record type for the entity outputs.
-    outputs = [p for p in enty.ports.values() if p.direction == 'out']
-    if slv_interface:
         output_names_and_types = [(p.name, typ_to_slv(p.typ)) for p in outputs]
+        # typ_to_slv creates new types every time so caching would never hit.
+        record_and_conversions = make_record_and_conversions
     else:
+        input_names_and_types = [(p.name, p.typ) for p in inputs]
         output_names_and_types = [(p.name, p.typ) for p in outputs]
-    output_record = typs.Record('t_output', output_names_and_types)
+        record_and_conversions = _record_and_conversions
     # Generate declarations and definitions for the functions to convert
     # the input and output types to and from std_logic_vector.
-    input_slv_declarations, input_slv_definitions = (
-        package_generator.make_record_declarations_and_definitions(
-            input_record))
-    output_slv_declarations, output_slv_definitions = (
-        package_generator.make_record_declarations_and_definitions(
-            output_record))
+    input_record, input_slv_declarations, input_slv_definitions = record_and_conversions(
+        't_input', tuple(input_names_and_types))
+    output_record, output_slv_declarations, output_slv_definitions = record_and_conversions(
+        't_output', tuple(output_names_and_types))
     # Generate use clauses required by the testbench.
+    fragments = _entity_fragments(enty)
     if slv_interface:
         use_clauses = 'use work.slvcodec.all;'
     else:
-        use_clauses = '\n'.join([
-            'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-            for u in enty.uses.values()])
-        use_clauses += '\n' + '\n'.join([
-            'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-            for u in enty.uses.values()
-            if (u.library not in ('ieee', 'std')) and ('_slvcodec' not in u.design_unit) and
-            (u.design_unit not in ('slvcodec',))])
+        use_clauses = fragments.testbench_use_clauses
     # Get the list of generic parameters for the testbench.
-    generic_params = []
-    for g in enty.generics.values():
-        as_str = '{}: {}'.format(g.name, g.typ)
-        if g.name in default_generics:
-            as_str += ' := {}'.format(default_generics[g.name])
-        as_str += ';'
-        generic_params.append(as_str)
     if not slv_interface:
-        generic_params = '\n'.join(generic_params)[:-1]
+        generic_params = make_generic_params(enty, default_generics)
     else:
         generic_params = ''
     # Combine the input and output record definitions with the slv conversion
@@ -232,36 +236,26 @@ def make_filetestbench(enty, add_double_wrapper=False, use_vunit=True,
         input_record.declaration(), output_record.declaration(),
         input_slv_declarations, input_slv_definitions,
         output_slv_declarations, output_slv_definitions])
-    clk_names = [p.name for p in enty.ports.values()
-                 if (p.direction == 'in') and (p.name in entity.CLOCK_NAMES)]
-    assert len(clk_names) in (0, 1)
-    clk_connections = '\n'.join(['{} => clk,'.format(clk) for clk in clk_names])
-    connections = ',\n'.join(['{} => {}.{}'.format(
-        p.name, {'in': 'input_data', 'out': 'output_data'}[p.direction], p.name)
-                              for p in enty.ports.values() if p.name not in clk_names])
+    clk_connections = '\n'.join(f'{clk} => clk,' for clk in clk_names)
+    connections = ',\n'.join(connections)
     if not slv_interface:
-        dut_generics = ',\n'.join(['{} => {}'.format(g.name, g.name)
-                                for g in enty.generics.values()])
+        dut_generics = fragments.wrapped_generics
     else:
         dut_generics = ''
     # Read in the testbench template and format it.
     if use_vunit:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'file_testbench.vhd')
+        template_name = 'file_testbench.vhd'
     elif use_pipes:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'pipe_testbench.vhd')
+        template_name = 'pipe_testbench.vhd'
     else:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'file_testbench_no_vunit.vhd')
+        template_name = 'file_testbench_no_vunit.vhd'
     if dut_name is None:
         if add_double_wrapper:
             dut_name = enty.identifier + '_toslvcodec'
         else:
             dut_name = enty.identifier
-    with open(template_fn, 'r') as f:
-        filetestbench_template = jinja2.Template(f.read())
-    filetestbench = filetestbench_template.render(
+    filetestbench = generator_utils.render_template(
+        template_name, output_filename,
         test_name='{}_tb'.format(enty.identifier),
         use_clauses=use_clauses,
         generic_params=generic_params,
@@ -281,10 +275,9 @@ def process_signals(signals, type_name):
     """
     Generate type declarations and definitions used by the testbench.
     """
-    names_and_types = [(p.name, p.typ) for p in signals]
-    record = typs.Record(type_name, names_and_types)
-    slv_declarations, slv_definitions = package_generator.make_record_declarations_and_definitions(
-        record)
+    names_and_types = tuple((p.name, p.typ) for p in signals)
+    record, slv_declarations, slv_definitions = _record_and_conversions(
+        type_name, names_and_types)
     if signals:
         definitions = [record.declaration(), slv_declarations, slv_definitions]
     else:
@@ -303,13 +296,7 @@ def make_use_clauses(enty):
     """
     Generate use clauses required by the testbench.
     """
-    use_clauses = '\n'.join([
-        'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()])
-    use_clauses += '\n' + '\n'.join([
-        'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()
-        if u.library not in ('ieee', 'std') and '_slvcodec' not in u.design_unit])
+    use_clauses = generator_utils.compute_use_clauses(generator_utils.uses_as_tuples(enty))
     return use_clauses
 
 
@@ -319,28 +306,18 @@ def make_generic_params(enty, default_generics=None):
     """
     if default_generics is None:
         default_generics = {}
-    else:
-        default_generics = default_generics.copy()
-
-    generic_params = []
-    for k, v in default_generics.items():
-        if isinstance(v, str) and (len(v) > 0) and (v[0] != "'"):
-            default_generics[k] = '"' + v + '"'
-
-    for g in enty.generics.values():
-        as_str = '{}: {}'.format(g.name, g.typ)
-        if g.name in default_generics:
-            as_str += ' := {}'.format(default_generics[g.name])
-        as_str += ';'
-        generic_params.append(as_str)
-    generic_params = '\n'.join(generic_params)[:-1]
+    default_generics = generator_utils.quote_generics(default_generics)
+    generic_params = ';\n'.join(
+        f'{g.name}: {g.typ} := {default_generics[g.name]}'
+        if g.name in default_generics else f'{g.name}: {g.typ}'
+        for g in enty.generics.values())
     return generic_params
 
 
 def make_filetestbench_multiple_clocks(
         enty, clock_domains, add_double_wrapper=False,
         default_output_path=None, default_generics=None,
-        clock_periods=None, clock_offsets=None, use_pipes=False):
+        clock_periods=None, clock_offsets=None, use_pipes=False, output_filename=None):
     '''
     Generate a testbench that reads inputs from a file, and writes outputs to
     a file.
@@ -354,6 +331,7 @@ def make_filetestbench_multiple_clocks(
       `default_generics`: The default values for the generics of the entity.
       `use_pipes`: If these is True then the testbench uses named pipes for input and output
          rather than just normal files.
+      `output_filename`: If given, the testbench is written to this file rather than returned.
     '''
     grouped_ports = enty.group_ports_by_clock_domain(clock_domains)
     definitions = []
@@ -363,10 +341,9 @@ def make_filetestbench_multiple_clocks(
         input_info = process_signals(inputs, 't_{}_inputs'.format(clock_name))
         output_info = process_signals(outputs, 't_{}_outputs'.format(clock_name))
         definitions += input_info['definitions'] + output_info['definitions']
-        for p in inputs:
-            connections.append('{} => {}_input_data.{}'.format(p.name, clock_name, p.name))
-        for p in outputs:
-            connections.append('{} => {}_output_data.{}'.format(p.name, clock_name, p.name))
+        for p in inputs + outputs:
+            record_signal = DIRECTION_TO_RECORD_SIGNAL[p.direction]
+            connections.append(f'{p.name} => {clock_name}_{record_signal}.{p.name}')
 
     use_clauses = make_use_clauses(enty)
     generic_params = make_generic_params(enty, default_generics)
@@ -375,18 +352,14 @@ def make_filetestbench_multiple_clocks(
     # Combine the input and output record definitions with the slv conversion
     # functions.
     definitions = '\n'.join(definitions)
-    clk_connections = '\n'.join(['{} => {}_clk,'.format(clk, clk)
-                                 for clk in clock_names])
+    clk_connections = '\n'.join(f'{clk} => {clk}_clk,' for clk in clock_names)
     connections = ',\n'.join(connections)
-    dut_generics = ',\n'.join(['{} => {}'.format(g.name, g.name)
-                               for g in enty.generics.values()])
+    dut_generics = _entity_fragments(enty).wrapped_generics
     # Read in the testbench template and format it.
     if use_pipes:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'pipe_testbench.vhd')
+        template_name = 'pipe_testbench.vhd'
     else:
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'file_testbench_multiple_clocks.vhd')
+        template_name = 'file_testbench_multiple_clocks.vhd'
     if add_double_wrapper:
         dut_name = enty.identifier + '_toslvcodec'
     else:
@@ -404,9 +377,8 @@ def make_filetestbench_multiple_clocks(
     clock_infos = [(name, clock_periods.get(name, '10 ns'), clock_offsets.get(name, '0 ns'),
                     len(clock_domains[name]) > 0)
                    for name in clock_names]
-    with open(template_fn, 'r') as f:
-        filetestbench_template = jinja2.Template(f.read())
-    filetestbench = filetestbench_template.render(
+    filetestbench = generator_utils.render_template(
+        template_name, output_filename,
         test_name='{}_tb'.format(enty.identifier),
         use_clauses=use_clauses,
         generic_params=generic_params,
@@ -462,35 +434,31 @@ def prepare_files(
         os.path.join(config.vhdldir, 'clock.vhd'),
     ]
     # Make file testbench
+    ftb_fn = os.path.join(directory, '{}_tb.vhd'.format(
+        resolved_entity.identifier))
     if clock_domains and ((len(clock_domains) > 1) or use_pipes):
-        ftb = make_filetestbench_multiple_clocks(
+        make_filetestbench_multiple_clocks(
             resolved_entity, clock_domains, add_double_wrapper, default_generics=default_generics,
             default_output_path=default_output_path,
-            clock_periods=clock_periods, clock_offsets=clock_offsets, use_pipes=use_pipes)
+            clock_periods=clock_periods, clock_offsets=clock_offsets, use_pipes=use_pipes,
+            output_filename=ftb_fn)
     else:
-        ftb = make_filetestbench(resolved_entity, add_double_wrapper, use_vunit=use_vunit,
-                                 default_generics=default_generics,
-                                 default_output_path=default_output_path, use_pipes=use_pipes,
-                                 slv_interface=slv_interface, dut_name=wrapper_name,
-                                 extra_logic=extra_logic, extra_definitions=extra_definitions,
-                                 )
-    ftb_fn = os.path.join(directory, '{}_tb.vhd'.format(
-        resolved_entity.identifier))
-    with open(ftb_fn, 'w') as f:
-        f.write(ftb)
+        make_filetestbench(resolved_entity, add_double_wrapper, use_vunit=use_vunit,
+                           default_generics=default_generics,
+                           default_output_path=default_output_path, use_pipes=use_pipes,
+                           slv_interface=slv_interface, dut_name=wrapper_name,
+                           extra_logic=extra_logic, extra_definitions=extra_definitions,
+                           output_filename=ftb_fn,
+                           )
     if add_double_wrapper:
-        fromslvcodec_wrapper, toslvcodec_wrapper = make_double_wrapper(
-                resolved_entity, default_generics=default_generics)
         fromslvcodec_fn = os.path.join(
                 dut_directory, resolved_entity.identifier + '_fromslvcodec.vhd')
         toslvcodec_fn = os.path.join(directory, resolved_entity.identifier + '_toslvcodec.vhd')
-        with open(fromslvcodec_fn, 'w') as f:
-            f.write(fromslvcodec_wrapper)
-            dut_fns.append(fromslvcodec_fn)
-        with open(toslvcodec_fn, 'w') as f:
-            f.write(toslvcodec_wrapper)
-            tb_fns.append(os.path.join(config.vhdldir, 'slvcodec.vhd'))
-            tb_fns.append(toslvcodec_fn)
+        make_double_wrapper(resolved_entity, default_generics=default_generics,
+                            output_filenames=(fromslvcodec_fn, toslvcodec_fn))
+        dut_fns.append(fromslvcodec_fn)
+        tb_fns.append(os.path.join(config.vhdldir, 'slvcodec.vhd'))
+        tb_fns.append(toslvcodec_fn)
     tb_fns.append(ftb_fn)
     resolved = {
         'entities': entities,
@@ -499,6 +467,33 @@ def prepare_files(
     return tb_fns, dut_fns, resolved
 
 
+def prepare_files_job(job):
+    '''
+    Runs `prepare_files` for a single (directory, filenames, top_entity, kwargs) job.
+    '''
+    directory, filenames, top_entity, kwargs = job
+    return prepare_files(directory, filenames, top_entity, **kwargs)
+
+
+def prepare_files_batch(jobs, max_workers=None):
+    '''
+    Runs `prepare_files` for several testbenches in parallel worker processes.
+
+    Args:
+      `jobs`: A list of (directory, filenames, top_entity, kwargs) tuples where
+          `kwargs` is a dictionary of optional arguments to `prepare_files`.
+          Each job should write to its own directory.
+      `max_workers`: The maximum number of worker processes.
+
+    Functions added with `math_parser.register_function` are only seen by the
+    worker processes if they are registered when a module is imported.
+
+    Returns a list of the `prepare_files` results in the same order as `jobs`.
+    '''
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(prepare_files_job, jobs))
+
+
 def add_slvcodec_files(directory, filenames):
     '''
     Parses files, and generates helper packages for existing packages that
@@ -521,7 +516,8 @@ def process_files(directory, filenames, entity_names_to_resolve=None):
             continue
         processed_filenames.add(filename)
         try:
-            new_parsed_entities, new_parsed_packages = vhdl_parser.parse_file(filename)
+            new_parsed_entities, new_parsed_packages = vhdl_parser.parse_file_if_changed(
+                filename)
             parsed_packages += new_parsed_packages
         except Exception as e:
             logger.error('Catching exception: {}'.format(str(e)))
@@ -559,8 +555,7 @@ def add_slvcodec_files_inner(directory, filenames, packages, filename_to_package
             if slvcodec_basename not in initial_basenames:
                 slvcodec_pkg = package_generator.make_slvcodec_package(packages[package_name])
                 slvcodec_package_filename = os.path.join(directory, slvcodec_basename)
-                with open(slvcodec_package_filename, 'w') as f:
-                    f.write(slvcodec_pkg)
+                pathlib.Path(slvcodec_package_filename).write_text(slvcodec_pkg)
                 combined_filenames.append(slvcodec_package_filename)
             else:
                 combined_filenames.append(initial_basenames[slvcodec_basename])
@@ -584,12 +579,9 @@ def make_add_slvcodec_files_and_setgenerics_wrapper(
         wrapper_filename = os.path.join(directory, wrapper_base_name)
         package_filename = os.path.join(directory, 'setgenerics_pkg.vhd')
         package_slvcodec_filename = os.path.join(directory, 'setgenerics_pkg_slvcodec.vhd')
-        with open(wrapper_filename, 'w') as f:
-            f.write(setgenerics_wrapper)
-        with open(package_filename, 'w') as f:
-            f.write(setgenerics_pkg)
-        with open(package_slvcodec_filename, 'w') as f:
-            f.write('''package setgenerics_pkg_slvcodec is
+        pathlib.Path(wrapper_filename).write_text(setgenerics_wrapper)
+        pathlib.Path(package_filename).write_text(setgenerics_pkg)
+        pathlib.Path(package_slvcodec_filename).write_text('''package setgenerics_pkg_slvcodec is
             end package;''')
         combined_filenames += [package_filename, package_slvcodec_filename, wrapper_filename]
         return combined_filenames
@@ -603,28 +595,13 @@ def make_formal_wrapper(enty, generics):
       `enty`: A resolved entity object parsed from the VHDL.
       `generics`: A dictionary of generics to set.
     """
-    generics = generics.copy()
-    for k, v in generics.items():
-        if isinstance(v, str) and (len(v) > 0) and (v[0] not in  ("'", '"')):
-            generics[k] = '"' + v + '"'
-    # Get the list of generic parameters for the testbench.
-    wrapped_generics = ',\n'.join(['{} => {}'.format(g.name, g.name)
-                                   for g in enty.generics.values()])
-    # Generate use clauses required by the testbench.
-    use_clauses = '\n'.join([
-        'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values() if (u.design_unit not in ('std_logic_1164', 'slvcodec')) and 
-                                       ('_slvcodec' not in u.design_unit)])
-    use_clauses += '\n' + '\n'.join([
-        'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()
-        if u.library not in ('ieee', 'std') and '_slvcodec' not in u.design_unit])
+    generics = generator_utils.quote_generics(generics)
+    fragments = _entity_fragments(enty)
+    use_clauses = fragments.wrapper_use_clauses
 
     # Read in the pkg template and format it.
     template_name = 'formal_pkg.vhd'
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-    with open(template_fn, 'r') as f:
-        template = jinja2.Template(f.read())
+    template = config.template_env.get_template(template_name)
     generic_infos = [{'name': g.name, 'type': g.typ, 'value': generics[g.name]}
                      for g in enty.generics.values()]
     pkg = template.render(
@@ -635,14 +612,12 @@ def make_formal_wrapper(enty, generics):
     use_clauses += '\nuse work.formal_pkg.all;'
     # Read in the template and format it.
     template_name = 'formal_wrapper.vhd'
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-    with open(template_fn, 'r') as f:
-        template = jinja2.Template(f.read())
+    template = config.template_env.get_template(template_name)
     wrapper = template.render(
         entity_name=enty.identifier,
         use_clauses=use_clauses,
-        wrapped_generics=wrapped_generics,
+        wrapped_generics=fragments.wrapped_generics,
         dut_name=enty.identifier,
-        ports=list(enty.ports.values()),
+        ports=fragments.ports,
         )
     return pkg, wrapper
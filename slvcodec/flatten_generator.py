@@ -17,11 +17,9 @@ e.g.
 """
 
 import logging
-import os
-
-import jinja2
 
 from slvcodec import entity, typs, package_generator, config, vhdl_parser, math_parser
+from slvcodec import generator_utils
 
 logger = logging.getLogger(__name__)
 
@@ -45,21 +43,27 @@ def flatten_type(typ, generics=None):
     """
     if generics is None:
         generics = {}
-    if hasattr(typ, 'names_and_subtypes'):
-        all_flattened = []
-        for name, subtype in typ.names_and_subtypes:
-            for flattened_name, flattened_subtype in flatten_type(subtype, generics):
-                all_flattened.append(([name] + flattened_name, flattened_subtype))
-    # FIXME need to implement array handling.
-    elif isinstance(typ, typs.ConstrainedArray):
-        all_flattened = []
-        subtype = typ.unconstrained_type.subtype
-        size = typs.apply_generics(generics, typ.size)
-        for index in range(size):
-            for flattened_name, flattened_subtype in flatten_type(subtype, generics):
-                all_flattened.append(([index] + flattened_name, flattened_subtype))
-    else:
-        all_flattened = [([], typ)]
+    all_flattened = []
+    # Walk the type depth first using a stack of (name components, type) pairs.
+    # Children are pushed in reverse so that they are popped in order.  Arrays are
+    # flattened as soon as they are popped so their elements stay in order too.
+    stack = [([], typ)]
+    while stack:
+        hierarchy, subtype = stack.pop()
+        if hasattr(subtype, 'names_and_subtypes'):
+            for name, element_subtype in reversed(subtype.names_and_subtypes):
+                stack.append((hierarchy + [name], element_subtype))
+        elif isinstance(subtype, typs.ConstrainedArray):
+            # Every element has the same type so flatten it once and copy the result
+            # for each index.
+            element_flattened = flatten_type(subtype.unconstrained_type.subtype, generics)
+            size = typs.apply_generics(generics, subtype.size)
+            for index in range(size):
+                for element_hierarchy, element_subtype in element_flattened:
+                    all_flattened.append((hierarchy + [index] + element_hierarchy,
+                                          element_subtype))
+        else:
+            all_flattened.append((hierarchy, subtype))
     return all_flattened
 
 
@@ -81,16 +85,13 @@ def make_wrapped_suffix(hierarchy):
          '(1).complex'
          Which can be used in VHDL to reference that component.
     """
-    suffix = ''
-    for level in hierarchy:
-        if isinstance(level, int):
-            suffix += '(' + str(level) + ')'
-        else:
-            suffix += '.' + level
+    suffix = ''.join(
+        '(' + str(level) + ')' if isinstance(level, int) else '.' + level
+        for level in hierarchy)
     return suffix
 
 
-def make_flat_wrapper(enty, wrapped_name, separator= '_', generics=None):
+def make_flat_wrapper(enty, wrapped_name, separator= '_', generics=None, output_filename=None):
     """
     Create a wrapper around a VHDL entity that flattens all the ports.
 
@@ -101,56 +102,58 @@ def make_flat_wrapper(enty, wrapped_name, separator= '_', generics=None):
       `generics`: Generics are hardwired when flattening.  This is because flattening
           often requires knowledge of the generics for example to determine the length
           of an array.
+      `output_filename`: If given, the wrapper is written to this file rather than returned.
 
     Return:
-      A string of the VHDL to define the wrapping entity.
+      A string of the VHDL to define the wrapping entity, or None if `output_filename`
+      was given.
     """
     # Generate use clauses required by the testbench.
-    use_clauses = '\n'.join([
-        'use {}.{}.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values() if (u.design_unit not in ('std_logic_1164', 'slvcodec')) and 
-                                       ('_slvcodec' not in u.design_unit)])
-    use_clauses += '\n' + '\n'.join([
-        'use {}.{}_slvcodec.{};'.format(u.library, u.design_unit, u.name_within)
-        for u in enty.uses.values()
-        if u.library not in ('ieee', 'std') and '_slvcodec' not in u.design_unit])
+    use_clauses = generator_utils.make_wrapper_use_clauses(enty)
     # Get the wrapper ports
     wrapper_ports = []
-
+    # Flattened arrays give many subports that share the same width expression so
+    # keep the evaluated and formatted widths.  Keyed by id since different math_parser
+    # classes with the same contents compare as equal tuples.
+    width_strs = {}
+    # Ports often share a type so only flatten each type once.  The generics are the
+    # same for every port so the type is enough to identify the result.
+    flattened_types = {}
     for port_name, port in enty.ports.items():
-        for subport_hierarchy, subport_type in flatten_type(port.typ, generics):
+        if id(port.typ) not in flattened_types:
+            flattened_types[id(port.typ)] = flatten_type(port.typ, generics)
+        for subport_hierarchy, subport_type in flattened_types[id(port.typ)]:
             if subport_hierarchy:
                 subport_suffix = make_wrapped_suffix(subport_hierarchy)
             else:
                 subport_suffix = ''
             subport_name = separator.join([port_name] + [str(x) for x in subport_hierarchy])
             if generics is not None:
-                width = typs.apply_generics(generics, subport_type.width)
+                width_key = id(subport_type.width)
+                if width_key not in width_strs:
+                    width = typs.apply_generics(generics, subport_type.width)
+                    width_strs[width_key] = math_parser.str_expression(width)
+                width_str = width_strs[width_key]
             wrapper_ports.append({
                 'name': subport_name,
                 'suffix': subport_suffix,
                 'typ': subport_type,
                 'parent_name': port_name,
                 'direction': port.direction,
-                'width': math_parser.str_expression(width),
+                'width': width_str,
             })
     # Read in the template and format it.
     template_name = 'flatten.vhd'
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates', template_name)
-    with open(template_fn, 'r') as f:
-        template = jinja2.Template(f.read())
+    quoted_generics = generator_utils.quote_generics(generics or {})
     combined_generics = []
     for generic in enty.generics.values():
-        value = generics[generic.name]
-        if isinstance(value, str):
-            if value[0] not in ("'", '"'):
-                value = '"' + value + '"'
         combined_generics.append({
             'name': generic.name,
             'typ': generic.typ,
-            'value': value,
+            'value': quoted_generics[generic.name],
             })
-    wrapper = template.render(
+    wrapper = generator_utils.render_template(
+        template_name, output_filename,
         entity_name=enty.identifier,
         generics=combined_generics,
         wrapped_name=enty.identifier,
@@ -1,12 +1,33 @@
+import concurrent.futures
 import os
+import re
 import subprocess
 import logging
-import filecmp
+import hashlib
 
 import yaml
+try:
+    # Use the libyaml bindings when they are available since they are much faster.
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
 logger = logging.getLogger(__name__)
 
+# Lines reporting generator generics look like 'Generator name=foo width=4'.
+GENERATOR_PATTERN = re.compile(r'Generator\s+(.*)')
+PARAM_PATTERN = re.compile(r'(\w+)=(\S+)')
+
+# The number of files passed to each ghdl analysis process.
+ANALYSIS_BATCH_SIZE = 32
+
+# Simulation output lines containing these are kept by run_single.
+RUN_OUTPUT_MARKERS = ('Generator', 'ghdl:error', 'assertion failure')
+
+# SHA-1 digests of files keyed by (filename, mtime, size) so that repeated calls to
+# generate_core don't read unchanged files again.
+_FILE_DIGESTS = {}
+
 
 class Launcher:
     """
@@ -52,17 +73,39 @@ class Launcher:
         return ' '.join([self.cmd] + self.args)
 
 
+def file_digest(filename):
+    '''
+    Get the SHA-1 digest of a file's contents.
+    '''
+    st = os.stat(filename)
+    key = (filename, st.st_mtime_ns, st.st_size)
+    if key not in _FILE_DIGESTS:
+        with open(filename, 'rb') as f:
+            _FILE_DIGESTS[key] = hashlib.sha1(f.read()).hexdigest()
+    return _FILE_DIGESTS[key]
+
+
+def same_contents(filename_a, filename_b):
+    '''
+    Check whether two files have the same contents.
+    Files with different sizes are different without reading them.
+    '''
+    if os.path.getsize(filename_a) != os.path.getsize(filename_b):
+        return False
+    return file_digest(filename_a) == file_digest(filename_b)
+
+
 def set_fusesoc_top_params(top_params, top_params_filename=None):
     top_params_filename = os.environ['FUSESOC_TOP_PARAMS']
     with open(top_params_filename, 'w') as f:
-        content = yaml.dump(top_params)
+        content = yaml.dump(top_params, Dumper=SafeDumper)
         f.write(content)
 
 
 def get_fusesoc_top_params():
     top_params_filename = os.environ['FUSESOC_TOP_PARAMS']
-    with open(top_params_filename, 'r') as f:
-        top_params = yaml.load(f)
+    with open(top_params_filename, 'rb') as f:
+        top_params = yaml.load(f, Loader=SafeLoader)
     return top_params
 
 
@@ -89,8 +132,8 @@ def generate_core(working_directory, core_name, parameters, config_filename=None
         output_dir = os.path.join(
             working_directory, 'build', '{}_0'.format(core_name), 'bld-vivado')
     yaml_filename = os.path.join(output_dir, '{}_0.eda.yml'.format(core_name))
-    with open(yaml_filename, 'r') as f:
-        data = yaml.load(f.read(), Loader=yaml.Loader)
+    with open(yaml_filename, 'rb') as f:
+        data = yaml.load(f, Loader=SafeLoader)
     base_filenames = [f['name'] for f in data['files']]
     filenames = [f if f[0] == '/' else
                  os.path.abspath(os.path.join(output_dir, f)) for f in base_filenames]
@@ -99,37 +142,76 @@ def generate_core(working_directory, core_name, parameters, config_filename=None
     # Filter them out.
     # FIXME: This is an ugly patch over a nasty problem.
     filtered_filenames = []
+    seen = set()
     basenames = {}
     for fn in filenames:
+        if fn in seen:
+            continue
         bn = os.path.basename(fn)
-        if fn not in filtered_filenames:
-            if bn in basenames:
-                logger.warning('Two files with the same name: {}, {}'.format(fn, basenames[bn]))
-                if not filecmp.cmp(fn, basenames[bn]):
-                    logger.warning('Two files with the same name but different contents: {}, {}'.format(fn, basenames[bn]))
-                    filtered_filenames.append(fn)
-            else:
-                basenames[bn] = fn
+        existing_fn = basenames.get(bn)
+        if existing_fn is not None:
+            logger.warning('Two files with the same name: {}, {}'.format(fn, existing_fn))
+            if not same_contents(fn, existing_fn):
+                logger.warning('Two files with the same name but different contents: {}, {}'.format(fn, existing_fn))
+                seen.add(fn)
                 filtered_filenames.append(fn)
+        else:
+            basenames[bn] = fn
+            seen.add(fn)
+            filtered_filenames.append(fn)
 
     if old_params is not None:
         os.environ['FUSESOC_TOP_PARAMS'] = old_params
     return filtered_filenames
 
 
-def compile_src_files(work_root, src_files):
+def analyze(work_root, file_names):
+    '''
+    Analyze files, in order, with a single ghdl process.
+    '''
+    args = ['-a', '--std=08']
+    args += file_names
+    logger.debug('Compiling {}'.format(file_names))
+    Launcher('ghdl', args,
+             cwd=work_root,
+             errormsg="Failed to analyze {}".format(' '.join(file_names))).run()
+
+
+def compile_src_files(work_root, src_files, compiled_files=None):
     '''
     Compiles src files using ghdl.
+
+    `compiled_files` is an optional list of (filename, digest) pairs for the files that
+    have already been analyzed into the library in `work_root`.  The files are analyzed
+    in order, so the files at the start of `src_files` that are unchanged from
+    `compiled_files` are still valid and are not analyzed again.  The list is updated
+    with the files analyzed by this call.
     '''
     logger.debug('compiling src files {}'.format([src_files]))
-    for file_name in src_files:
-        if file_name.split('.')[-1] in ('vhd', 'vhdl'):
-            args = ['-a', '--std=08']
-            args += [file_name]
-            logger.debug('Compiling {}'.format(file_name))
-            Launcher('ghdl', args,
-                     cwd=work_root,
-                     errormsg="Failed to analyze {}".format(file_name)).run()
+    vhdl_files = [file_name for file_name in src_files
+                  if file_name.split('.')[-1] in ('vhd', 'vhdl')]
+    if compiled_files is not None:
+        digests = [(file_name, file_digest(file_name)) for file_name in vhdl_files]
+        n_unchanged = 0
+        for new, old in zip(digests, compiled_files):
+            if new != old:
+                break
+            n_unchanged += 1
+        logger.debug('Skipping {} unchanged files'.format(n_unchanged))
+        vhdl_files = vhdl_files[n_unchanged:]
+    # The files all write to the same work library and must be analyzed in order,
+    # so rather than running them in parallel pass batches of them to each ghdl process
+    # to avoid starting a process for every file.
+    for start in range(0, len(vhdl_files), ANALYSIS_BATCH_SIZE):
+        batch = vhdl_files[start: start + ANALYSIS_BATCH_SIZE]
+        try:
+            analyze(work_root, batch)
+        except RuntimeError:
+            # Analyze the files one at a time so the error names the failing file.
+            for file_name in batch:
+                analyze(work_root, [file_name])
+    if compiled_files is not None:
+        compiled_files[:] = digests
 
 
 def elaborate(work_root, top_name):
@@ -141,38 +223,42 @@ def elaborate(work_root, top_name):
              errormsg="Failed to elaborate {}".format(top_name)).run()
 
 
-def run_single(work_root, top_name, top_generics):
+def run_single(work_root, top_name, top_generics, index=0):
     '''
     Run a single ghdl simulation and return a list of errors.
     Used to determine which generics are required by generated entities.
+    Only the output lines reporting generators or errors are kept.
+    `index` distinguishes the output files of simulations run at the same time.
     '''
-    stderr_fn = os.path.join(work_root, 'stderr_0')
-    stdout_fn = os.path.join(work_root, 'stdout_0')
+    stderr_fn = os.path.join(work_root, 'stderr_{}'.format(index))
+    stdout_fn = os.path.join(work_root, 'stdout_{}'.format(index))
     args = ['-r', '--std=08']
     args += [top_name]
     for generic_name, generic_value in top_generics.items():
         args.append('-g{}={}'.format(generic_name, generic_value))
-    try:
-        with open(stderr_fn, 'w') as stderr_f:
-            with open(stdout_fn, 'w') as stdout_f:
-                Launcher('ghdl', args,
-                         cwd=work_root,
-                         stdout=stdout_f,
-                         stderr=stderr_f,
-                         errormsg="Simulation failed").run()
-    except RuntimeError as error:
-        with open(stdout_fn, 'r') as stdout_f:
-            lines = list(stdout_f)
-            for line_index, line in enumerate(lines):
+    # Open the output files for reading as well so that they don't need to be reopened
+    # once ghdl has finished.
+    with open(stderr_fn, 'w+') as stderr_f, open(stdout_fn, 'w+') as stdout_f:
+        try:
+            Launcher('ghdl', args,
+                     cwd=work_root,
+                     stdout=stdout_f,
+                     stderr=stderr_f,
+                     errormsg="Simulation failed").run()
+        except RuntimeError as error:
+            stdout_f.seek(0)
+            for line in stdout_f:
+                line = line.rstrip('\n')
                 if ('ghdl:error' in line) or ('assertion failure' in line):
                     logger.error(line)
                 else:
                     logger.debug(line)
-        raise error
-    with open(stderr_fn, 'r') as stderr_f:
-        error_lines = stderr_f.readlines()
-    with open(stdout_fn, 'r') as stdout_f:
-        error_lines += stdout_f.readlines()
+            raise error
+        # Simulation output can be large so filter it while reading.
+        stderr_f.seek(0)
+        stdout_f.seek(0)
+        error_lines = [line.rstrip('\n') for f in (stderr_f, stdout_f) for line in f
+                       if any(marker in line for marker in RUN_OUTPUT_MARKERS)]
     return error_lines
 
 
@@ -183,15 +269,22 @@ def extract_generics(error_lines):
     '''
     ds = []
     for line in error_lines:
+        match = GENERATOR_PATTERN.search(line)
+        if match is None:
+            continue
         d = {}
-        pieces = line.split('Generator')
-        if len(pieces) == 2:
-            params = pieces[1].split()
-            for param in params:
-                key, value = param.split('=')
-                assert key not in d
-                d[key] = value
-                ds.append(d)
+        for param in match.group(1).split():
+            param_match = PARAM_PATTERN.fullmatch(param)
+            if param_match is None:
+                raise ValueError('Cannot parse generator parameter {} in {}'.format(
+                    param, line.strip()))
+            key, value = param_match.groups()
+            if key in d:
+                raise ValueError('Repeated generator parameter {} in {}'.format(
+                    key, line.strip()))
+            d[key] = value
+        if d:
+            ds.append(d)
     return ds
 
 
@@ -200,13 +293,26 @@ def run(work_root, top_name, all_top_generics, generator_d):
     Run the design using ghdl.
     The purpose is to see which modules are used with which generic parameters
     so that we can call the generic parameters appropriately.
+
+    There is one simulation for each set of generics in `all_top_generics`. They run
+    at the same time and all in `work_root`.  Each simulation's stdout and stderr go to
+    their own files, but the design must not write files with fixed names in the
+    working directory, since the simulations would overwrite each other's files.
     '''
     updated_generators = False
-    for top_generics in all_top_generics:
-        error_lines = run_single(work_root, top_name, top_generics)
+    all_top_generics = list(all_top_generics)
+    if not all_top_generics:
+        return updated_generators
+    # The simulations are independent so run them at the same time.
+    max_workers = min(len(all_top_generics), os.cpu_count() or 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        all_error_lines = list(executor.map(
+            run_single, [work_root] * len(all_top_generics),
+            [top_name] * len(all_top_generics), all_top_generics,
+            range(len(all_top_generics))))
+    for error_lines in all_error_lines:
         ds = extract_generics(error_lines)
         for d in ds:
-            fd = frozenset((k, v) for k, v in d.items())
             if d['name'] not in generator_d:
                 generator_d[d['name']] = []
             g = generator_d[d['name']]
@@ -217,10 +323,12 @@ def run(work_root, top_name, all_top_generics, generator_d):
 
 def compile_elab_and_run(core_name, work_root, all_top_generics, top_params, top_name,
                          generator_d, additional_generator=None, config_filename=None,
-                         other_files=None, verbose=False):
+                         other_files=None, verbose=False, compiled_files=None):
     '''
     Run the generators, compile and elaborate the files, and run ghdl
     to see if any of the generators were missing generics.
+    `compiled_files` is passed to `compile_src_files` so that files that were already
+    analyzed in an earlier call are skipped.
     '''
     if other_files is None:
         other_files = []
@@ -228,7 +336,7 @@ def compile_elab_and_run(core_name, work_root, all_top_generics, top_params, top
                                tool='vivado', verbose=verbose)
     if additional_generator is not None:
         file_names = additional_generator(work_root, file_names)
-    compile_src_files(work_root, other_files + file_names)
+    compile_src_files(work_root, other_files + file_names, compiled_files=compiled_files)
     if top_name is not None:
         elaborate(work_root, top_name)
         found_new_parameters = run(
@@ -245,13 +353,16 @@ def generate_core_iteratively(core_name, work_root, all_top_generics, top_params
     elaboration_params = {}
     top_params['elaboration_params'] = elaboration_params
     iteration_count = 0
+    # Only the generated files for which new generics were found change between
+    # iterations so keep track of what has already been analyzed.
+    compiled_files = []
     while found_new_parameters:
         if iteration_count > 5:
             raise RuntimeError('Too many iterations to generator core.')
         filenames, found_new_parameters = compile_elab_and_run(
             core_name, work_root, all_top_generics, top_params, top_name,
             elaboration_params, additional_generator, config_filename,
-            other_files=other_files, verbose=verbose,
+            other_files=other_files, verbose=verbose, compiled_files=compiled_files,
         )
         iteration_count += 1
     return filenames
@@ -0,0 +1,73 @@
+"""
+Helpers shared by the modules that generate VHDL wrappers and testbenches.
+"""
+
+import functools
+
+from slvcodec import config
+
+
+def quote_generics(generics):
+    """
+    Returns a copy of the generics where string values are wrapped in double quotes
+    so that they can be used in VHDL.  Values already starting with a single or double
+    quote are left alone.
+    """
+    return {
+        k: '"' + v + '"' if isinstance(v, str) and (len(v) > 0) and (v[0] not in ("'", '"'))
+        else v
+        for k, v in generics.items()}
+
+
+def render_template(template_name, output_filename=None, **context):
+    """
+    Render a template from the templates directory.
+    If `output_filename` is given the output is streamed into that file and None is
+    returned, otherwise the rendered string is returned.
+    """
+    template = config.template_env.get_template(template_name)
+    if output_filename is None:
+        return template.render(**context)
+    template.stream(**context).dump(output_filename, encoding='utf-8')
+    return None
+
+
+def uses_as_tuples(enty):
+    """
+    Get the entity's package dependencies as a tuple of
+    (library, design_unit, name_within) tuples.
+    """
+    return tuple((u.library, u.design_unit, u.name_within) for u in enty.uses.values())
+
+
+@functools.lru_cache(maxsize=256)
+def compute_use_clauses(uses, excluded_design_units=None, excluded_slvcodec_design_units=()):
+    """
+    Generate use clauses for the packages and for their matching `_slvcodec` packages.
+    Args:
+      `uses`: A tuple of (library, design_unit, name_within) tuples.
+      `excluded_design_units`: If this is not None then these packages, and any packages
+          that are already `_slvcodec` packages, are not used directly.
+      `excluded_slvcodec_design_units`: Packages for which the matching `_slvcodec` package
+          is not used.
+    """
+    plain = []
+    slv = []
+    for library, design_unit, name_within in uses:
+        is_slvcodec = '_slvcodec' in design_unit
+        if (excluded_design_units is None) or (
+                (design_unit not in excluded_design_units) and not is_slvcodec):
+            plain.append(f'use {library}.{design_unit}.{name_within};')
+        if ((library not in ('ieee', 'std')) and not is_slvcodec and
+                (design_unit not in excluded_slvcodec_design_units)):
+            slv.append(f'use {library}.{design_unit}_slvcodec.{name_within};')
+    return '\n'.join(plain) + '\n' + '\n'.join(slv)
+
+
+def make_wrapper_use_clauses(enty):
+    """
+    Generate use clauses required by a wrapper that sits between the entity and
+    the slvcodec conversions.
+    """
+    return compute_use_clauses(
+        uses_as_tuples(enty), excluded_design_units=('std_logic_1164', 'slvcodec'))
@@ -3,11 +3,13 @@ Functions to deal with doing math on algebraic strings.
 Useful for parsing VHDL.
 '''
 
-import tokenize
 import collections
+import functools
+import itertools
 import logging
 import math
-from io import StringIO
+import re
+import sys
 
 
 logger = logging.getLogger(__name__)
@@ -28,9 +30,14 @@ def logceil(argument):
     2
     >>> logceil(7)
     3
+    >>> logceil(pow(2, 60) + 1)
+    61
     '''
     if argument <= 2:
         value = 1
+    elif isinstance(argument, int):
+        # Exact for integers, and avoids rounding problems at powers of two.
+        value = (argument - 1).bit_length()
     else:
         value = int(math.ceil(math.log(argument)/math.log(2)))
     return value
@@ -56,6 +63,8 @@ def logceil_1to0(argument):
     '''
     if argument < 2:
         value = 0
+    elif isinstance(argument, int):
+        value = (argument - 1).bit_length()
     else:
         value = int(math.ceil(math.log(argument)/math.log(2)))
     return value
@@ -83,6 +92,9 @@ def register_function(name, function):
     '''
     assert name not in REGISTERED_FUNCTIONS
     REGISTERED_FUNCTIONS[name] = function
+    # Earlier parses and simplifications could not evaluate the new function.
+    parse_string.cache_clear()
+    parse_and_simplify.cache_clear()
 
 
 class MathParsingError(Exception):
@@ -103,11 +115,16 @@ def as_number(v):
     >>> as_number(100)
     100
     >>> as_number('3.0.0')
+    >>> as_number('inf')
     '''
+    if isinstance(v, int):
+        return v
+    if isinstance(v, str) and ((not v) or v[0].isalpha() or v[0] in '_"'):
+        # Identifiers and quoted literals are never numbers so don't bother
+        # raising and catching an exception for them.
+        return None
     try:
-        if isinstance(v, int):
-            o = v
-        elif isinstance(v, float):
+        if isinstance(v, float):
             if v == int(v):
                 o = int(v)
             else:
@@ -145,7 +162,7 @@ def transform(item, f):
     Transform an object with a function.  The object will only be transformed
     if it has a transform method.
     '''
-    if hasattr(item, 'transform'):
+    if isinstance(item, _HAS_TRANSFORM):
         transformed = item.transform(f)
     else:
         transformed = item
@@ -157,13 +174,25 @@ def collect(item, f):
     Retrieve items from an object with a function.  Items will only be returned
     if the object has a collect method.
     '''
-    if hasattr(item, 'collect'):
+    if isinstance(item, _HAS_TRANSFORM):
         collected = item.collect(f)
     else:
         collected = []
     return collected
 
 
+def str_float(item):
+    '''
+    Returns a string representation of a float, without the decimal point if it
+    is a whole number.
+    '''
+    if int(item) == item:
+        o = str(int(item))
+    else:
+        o = str(item)
+    return o
+
+
 def str_expression(item):
     '''
     Returns a string representation of the mathematical equation.
@@ -171,16 +200,20 @@ def str_expression(item):
     >>> str_expression(Addition([Term(number=3, expression='fish'), Term(number=1, expression='bear')]))
     '(3*fish+bear)'
     '''
-    if isinstance(item, str):
+    # Most items are exactly one of the common types so look those up directly.
+    function = _STR_DISPATCH.get(type(item))
+    if function is not None:
+        o = function(item)
+    elif isinstance(item, str):
         o = item
     elif isinstance(item, int):
         o = str(item)
     elif isinstance(item, float):
-        if int(item) == item:
-            o = str(int(item))
-        else:
-            o = str(item)
+        o = str_float(item)
+    elif isinstance(item, _HAS_STR_EXPRESSION):
+        o = item.str_expression()
     elif hasattr(item, 'str_expression'):
+        # Constants and generics from `typs` can also appear in expressions.
         o = item.str_expression()
     else:
         raise MathParsingError('Cannot use str_expression on {}'.format(item))
@@ -194,6 +227,15 @@ def get_constant_list(item):
     >>> get_constant_list(item) == {'bear', 'fish'}
     True
     '''
+    return set(get_constant_leaves(item))
+
+
+def get_constant_leaves(item):
+    '''
+    Returns a list of the variables in the item, including repeats.
+    The set is only built once by `get_constant_list` rather than at every
+    level of the expression.
+    '''
     if isinstance(item, str):
         if '"' in item:
             # Probably something like "001"
@@ -204,8 +246,8 @@ def get_constant_list(item):
         else:
             collected = [item]
     else:
-        collected = collect(item, get_constant_list)
-    return set(collected)
+        collected = collect(item, get_constant_leaves)
+    return collected
 
 
 def parse_integers(item):
@@ -221,81 +263,26 @@ def parse_integers(item):
     >>> parse_integers(Expression(['fish', '6.2', 5, '7']))
     Expression(items=('fish', 6.2, 5, 7))
     '''
-    if is_number(item):
-        parsed = as_number(item)
-    else:
+    parsed = as_number(item)
+    if parsed is None:
         parsed = transform(item, parse_integers)
     return parsed
 
 
-def parse_parentheses(item):
-    '''
-    Group items into expressions based on location of parentheses.
-
-    Only 'Expression` has a `parse_parentheses' method so see that
-    function for examples.
-    '''
-    if hasattr(item, 'parse_parentheses'):
-        parsed = item.parse_parentheses()
-    else:
-        parsed = transform(item, parse_parentheses)
-    return parsed
-
-
-def parse_functions(item):
-    '''
-    Identify functions in the expression.
-    Parentheses must have been first parsed.
-
-    Only `Expression` has a `parse_functions` method so see that function
-    for examples.
-    '''
-    if hasattr(item, 'parse_functions'):
-        parsed = item.parse_functions()
-    else:
-        parsed = transform(item, parse_functions)
-    return parsed
-
-
-def parse_multiplication(item):
-    '''
-    Groups multipled and divided items together.
-
-    Only `Expression` has a `parse_multiplication` method so see that function
-    for examples.
-    '''
-    if hasattr(item, 'parse_multiplication'):
-        parsed = item.parse_multiplication()
-    else:
-        parsed = transform(item, parse_multiplication)
-    return parsed
-
-
-def parse_addition(item):
-    '''
-    Convert an expression into a list of added terms.
-
-    Only `Expression` has a `parse_multiplication` method so see that function
-    for examples.
-    '''
-    if hasattr(item, 'parse_addition'):
-        parsed = item.parse_addition()
-    else:
-        parsed = transform(item, parse_addition)
-    return parsed
-
-
 def simplify(item):
     '''
     Simplify the math a few times.
 
     Logs a warning if it does not converge.
     '''
+    if not isinstance(item, _HAS_TRANSFORM):
+        # Strings and numbers are already as simple as they get.
+        return item
     old_value = item
     max_simplifications = 5
     hit_limit = True
     for dummy_index in range(max_simplifications):
-        if hasattr(old_value, 'simplify'):
+        if isinstance(old_value, _HAS_SIMPLIFY):
             new_value = old_value.simplify()
         else:
             new_value = transform(old_value, simplify)
@@ -326,9 +313,8 @@ def make_substitute_function(d):
 
 
 def get_value(item):
-    if is_number(item):
-        result = as_number(item)
-    else:
+    result = as_number(item)
+    if result is None:
         result = as_number(item.value())
     return result
 
@@ -353,9 +339,8 @@ class Expression(ExpressionBase):
         return o
 
     def collect(self, f):
-        collected = []
-        for item in self.items:
-            collected += f(item)
+        collected = list(itertools.chain.from_iterable(
+            f(item) for item in self.items))
         return collected
 
     def value(self):
@@ -364,97 +349,6 @@ class Expression(ExpressionBase):
     def str_expression(self):
         return ' '.join([str_expression(item) for item in self.items])
 
-    def parse_functions(self):
-        '''
-        Find strings followed immediately by an expression.
-        Assume that is a function.
-
-        >>> s = 'logceil(5) - 2'
-        >>> e = Expression(tokenize_string(s))
-        >>> parsed_parentheses = e.parse_parentheses()
-        >>> parsed_parentheses.parse_functions()
-        Expression(items=(Function(name='logceil', arguments=('5',)), '-', '2'))
-        >>> e = Expression(tokenize_string('logceil(logceil(5)) - 2'))
-        >>> parsed_parentheses = e.parse_parentheses()
-        >>> parsed_parentheses.parse_functions()
-        Expression(items=(Function(name='logceil', arguments=(Function(name='logceil', arguments=('5',)),)), '-', '2'))
-        >>> s = 'minimum(5+6, 20-2)'
-        >>> e = Expression(tokenize_string(s))
-        >>> parsed_parentheses = e.parse_parentheses()
-        >>> parsed_parentheses.parse_functions()
-        Expression(items=(Function(name='minimum', arguments=(Expression(items=('5', '+', '6')), Expression(items=('20', '-', '2')))),))
-        '''
-        items = [parse_functions(item) for item in self.items]
-        last_item = None
-        new_items = []
-        for item in items:
-            if (isinstance(last_item, str) and last_item[0].isalpha() and
-                    isinstance(item, Expression)):
-                # Split arguments by commas
-                arguments = []
-                argument = []
-
-                def add_argument(argument):
-                    assert len(argument) > 0
-                    if len(argument) == 1:
-                        arguments.append(argument[0])
-                    else:
-                        arguments.append(Expression(argument))
-
-                for subitem in item.items:
-                    if subitem == ',':
-                        add_argument(argument)
-                        argument = []
-                    else:
-                        argument.append(subitem)
-                add_argument(argument)
-                function_item = Function(name=last_item, arguments=tuple(arguments))
-                new_items.append(function_item)
-                last_item = None
-            else:
-                if last_item is not None:
-                    new_items.append(last_item)
-                last_item = item
-        if last_item is not None:
-            new_items.append(last_item)
-        return Expression(new_items)
-
-    def parse_parentheses(self):
-        '''
-        Create new sub Expressions for items contained within parentheses.
-
-        >>> s = '(fish + (bear * 3)) - 9'
-        >>> e = Expression(tokenize_string(s))
-        >>> e.parse_parentheses()
-        Expression(items=(Expression(items=('fish', '+', Expression(items=('bear', '*', '3')))), '-', '9'))
-        '''
-        open_braces = 0
-        new_expression = []
-        for item in self.items:
-            if item == '(':
-                if open_braces == 0:
-                    stack = []
-                else:
-                    stack.append(item)
-                open_braces += 1
-            elif item == ')':
-                if open_braces == 1:
-                    sub_expression = Expression(stack).parse_parentheses()
-                    new_expression.append(sub_expression)
-                    stack = []
-                elif open_braces == 0:
-                    raise MathParsingError('More closing than opening braces')
-                else:
-                    stack.append(item)
-                open_braces -= 1
-            elif open_braces > 0:
-                stack.append(item)
-            else:
-                new_expression.append(parse_parentheses(item))
-        if open_braces > 0:
-            raise MathParsingError('All braces not closed.')
-        return Expression(new_expression)
-
     @staticmethod
     def finish_multiplication_term(items):
         parsed = []
@@ -465,45 +359,14 @@ class Expression(ExpressionBase):
             parsed += items
         return parsed
 
-    def parse_multiplication(self):
-        '''
-        Goes through the expression items and groups terms that are multiplied
-        together into a Multiplication object.
-
-        >>> Expression(tokenize_string('3 * 4')).parse_multiplication()
-        Multiplication(powers=(Power(number=1, expression='3'), Power(number=1, expression='4')))
-        >>> Expression(tokenize_string('bear + 2 / fish')).parse_multiplication()
-        Expression(items=('bear', '+', Multiplication(powers=(Power(number=1, expression='2'), Power(number=-1, expression='fish')))))
-        '''
-        parsed = []
-        possible_multiplication = []
-        for item in self.items:
-            if item in ('-', '+'):
-                parsed += Expression.finish_multiplication_term(
-                    possible_multiplication)
-                possible_multiplication = []
-                parsed.append(item)
-            else:
-                possible_multiplication.append(parse_multiplication(item))
-        parsed += Expression.finish_multiplication_term(possible_multiplication)
-        if len(parsed) == 1:
-            wrapped = parsed[0]
-        else:
-            wrapped = Expression(parsed)
-        return wrapped
-
-    def parse_addition(self):
+    @staticmethod
+    def finish_addition(items):
         '''
-        Goes through the items in the expression and groups together items
-        that are added together into an Addition object.
-
-        >>> Expression(tokenize_string('3 - 4')).parse_addition()
-        Addition(terms=(Term(number=1, expression='3'), Term(number=-1, expression='4')))
+        Group items that have already had their additions parsed into an Addition object.
         '''
-        if not self.items:
+        if not items:
             o = Addition([])
             return o
-        items = [parse_addition(x) for x in self.items]
         numbers = []
         expressions = []
         sign = 1
@@ -565,23 +428,23 @@ class Function(FunctionBase):
         return f
 
     def collect(self, f):
-        collected = []
-        for arg in self.arguments:
-            collected += f(arg)
+        collected = list(itertools.chain.from_iterable(
+            f(arg) for arg in self.arguments))
         return collected
 
     def value(self):
         arguments = [get_value(arg) for arg in self.arguments]
-        if self.name in REGISTERED_FUNCTIONS:
-            v = REGISTERED_FUNCTIONS[self.name](*arguments)
-        else:
+        function = REGISTERED_FUNCTIONS.get(self.name)
+        if function is None:
             raise MathParsingError('Unknown function {}'.format(self.name))
+        v = function(*arguments)
         return v
 
     def simplify(self):
         arguments = [simplify(arg) for arg in self.arguments]
-        if all(is_number(arg) for arg in arguments) and (self.name in REGISTERED_FUNCTIONS):
-            o = REGISTERED_FUNCTIONS[self.name](*arguments)
+        function = REGISTERED_FUNCTIONS.get(self.name)
+        if (function is not None) and all(is_number(arg) for arg in arguments):
+            o = function(*arguments)
         else:
             o = Function(name=self.name, arguments=tuple(arguments))
         return o
@@ -628,6 +491,8 @@ class Power(PowerBase):
 
         >>> Power(-2, 'fish').str_expression()
         '1/fish/fish'
+        >>> Power(3, 'fish').str_expression()
+        'fish*fish*fish'
         >>> Power(1, 'bear').str_expression()
         'bear'
         >>> Power(0, 5).str_expression()
@@ -638,11 +503,11 @@ class Power(PowerBase):
         elif (self.number == 0) or (self.expression == 1):
             s = '1'
         else:
-            absnumber = abs(self.number)
+            expression = str_expression(self.expression)
             if self.number > 0:
-                s = '*'.join([str_expression(self.expression)]*absnumber)
+                s = expression + ('*' + expression) * (self.number - 1)
             else:
-                s = '/'.join(['1']+[str_expression(self.expression)]*absnumber)
+                s = '1' + ('/' + expression) * (-self.number)
         return s
 
 
@@ -663,9 +528,8 @@ class Multiplication(MultiplicationBase):
         return t
 
     def collect(self, f):
-        collected = []
-        for item in self.powers:
-            collected += f(item)
+        collected = list(itertools.chain.from_iterable(
+            f(item) for item in self.powers))
         return collected
 
     def value(self):
@@ -686,17 +550,15 @@ class Multiplication(MultiplicationBase):
         >>> Multiplication((Power(3, 2), Power(-1, 10))).simplify()
         0.8
         '''
-        new_powers = collections.OrderedDict()
+        new_powers = {}
         powers = [transform(item, simplify) for item in self.powers]
         pure = 1
         for power in powers:
             if is_number(power.expression):
                 pure *= power.value()
             else:
-                if power.expression not in new_powers:
-                    new_powers[power.expression] = Power(
-                        expression=power.expression, number=0)
-                old_number = new_powers[power.expression].number
+                old_power = new_powers.get(power.expression)
+                old_number = 0 if old_power is None else old_power.number
                 new_number = old_number + power.number
                 new_power = Power(expression=power.expression, number=new_number)
                 new_powers[power.expression] = new_power
@@ -808,9 +670,8 @@ class Addition(AdditionBase):
         return t
 
     def collect(self, f):
-        collected = []
-        for item in self.terms:
-            collected += f(item)
+        collected = list(itertools.chain.from_iterable(
+            f(item) for item in self.terms))
         return collected
 
     def value(self):
@@ -896,19 +757,15 @@ class Addition(AdditionBase):
                 new_term = term
                 expanded_terms.append(new_term)
         numbers_and_expressions = [(t.number, t.expression) for t in expanded_terms]
-        d = collections.OrderedDict()
+        d = {}
         int_part = 0
         for n, e in numbers_and_expressions:
             if is_number(e):
                 int_part += int(e) * n
             else:
-                if e not in d:
-                    d[e] = n
-                else:
-                    d[e] += n
+                d[e] = d.get(e, 0) + n
         d[int_part] = 1
-        cleaned_d = collections.OrderedDict(
-            [(k, v) for k, v in d.items() if (v != 0) and (k != 0)])
+        cleaned_d = {k: v for k, v in d.items() if (v != 0) and (k != 0)}
         new_expressions = list(cleaned_d.keys())
         new_numbers = [cleaned_d[k] for k in new_expressions]
         if len(new_expressions) == 1:
@@ -927,43 +784,195 @@ class Addition(AdditionBase):
         return o
 
 
+# Node types used for dispatch in the free functions above.
+_HAS_TRANSFORM = (Expression, Unknown, Function, Power, Multiplication, Term, Addition)
+_HAS_STR_EXPRESSION = (Expression, Function, Power, Multiplication, Term, Addition)
+_HAS_SIMPLIFY = (Function, Multiplication, Addition)
+_STR_DISPATCH = {str: str, int: str, float: str_float}
+_STR_DISPATCH.update((node_type, node_type.str_expression) for node_type in _HAS_STR_EXPRESSION)
+
+
+# Matches the same tokens that python's tokenize module finds in math expressions:
+# quoted strings and characters (with python's string prefixes), names,
+# based literals such as 16#FF#, numbers (which may contain underscores as in VHDL),
+# multi-character operators and then any other single character.
+TOKEN_PATTERN = re.compile(r'''
+    (?:[bBfFrRuU]|[bBfF][rR]|[rR][bBfF])?(?:"[^"\n]*"|'[^'\n]*')
+    | [^\W\d]\w*
+    | \d(?:_?\d)*\#[\w.]+\#(?:[eE][-+]?\d+)?
+    | (?:\d(?:_?\d)*(?:\.(?:\d(?:_?\d)*)?)?|\.\d(?:_?\d)*)(?:[eE][-+]?\d(?:_?\d)*)?
+    | \*\*=? | //=? | <<=? | >>=? | -> | [-+*/%@&|^<>=!]=
+    | \S
+    ''', re.VERBOSE)
+
+
 def tokenize_string(s):
     '''
     Break a string up into tokens.
+
+    >>> tokenize_string('logceil(5) - 2*fish')
+    ['logceil', '(', '5', ')', '-', '2', '*', 'fish']
+    >>> tokenize_string('2 ** 6.5')
+    ['2', '**', '6.5']
+
+    The tokens are interned since the same identifiers appear in many expressions.
     '''
-    tokens = [
-        t.string for t in tokenize.generate_tokens(StringIO(s).readline)
-        if t.string and (not t.string.isspace())]
-    return tokens
+    return [sys.intern(token) for token in TOKEN_PATTERN.findall(s)]
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_string(s):
     '''
     Tokenize a string and then parse it.
+    The same expressions appear many times in VHDL so the results are cached.
     '''
     tokens = tokenize_string(s)
-    expression = Expression(tokens)
-    item = parse(expression)
+    item = parse_tokens(tokens)
     return item
 
 
-def parse(item):
+def parse_tokens(tokens):
     '''
-    Parsed a tokenized string.
+    Parse a list of tokens.
+
+    Each level of parentheses is parsed once it is closed, so the tokens are only
+    passed over once.
+
+    >>> parse_tokens(tokenize_string('3 * (fish + 2) - logceil(bear)'))
+    Addition(terms=(Term(number=1, expression=Multiplication(powers=(Power(number=1, expression=3), Power(number=1, expression=Addition(terms=(Term(number=1, expression='fish'), Term(number=1, expression=2))))))), Term(number=-1, expression=Function(name='logceil', arguments=('bear',)))))
     '''
-    if '**' in item.items:
+    if '**' in tokens:
         raise MathParsingError('symbolic math cannot parse power "**" syntax')
-    parsed_integers = parse_integers(item)
-    parsed_parentheses = parse_parentheses(parsed_integers)
-    parsed_functions = parse_functions(parsed_parentheses)
-    parsed_multiplication = parse_multiplication(parsed_functions)
-    parsed_addition = parse_addition(parsed_multiplication)
-    return parsed_addition
+    if len(tokens) == 1:
+        return parse_integers(tokens[0])
+    # Check the parentheses first so that unbalanced parentheses are reported before
+    # any other problems.
+    open_braces = 0
+    for token in tokens:
+        if token == '(':
+            open_braces += 1
+        elif token == ')':
+            if open_braces == 0:
+                raise MathParsingError('More closing than opening braces')
+            open_braces -= 1
+    if open_braces > 0:
+        raise MathParsingError('All braces not closed.')
+    items, is_tokens, _ = parse_level(tokens, 0)
+    return finish_level(items, is_tokens)
+
+
+def parse_level(tokens, position):
+    '''
+    Parse the tokens from `position` up to the closing parenthesis of the level.
+
+    Returns the items in the level, whether each of those items is an unparsed token,
+    and the position after the closing parenthesis.  Numbers are converted, and
+    parenthesized groups are either parsed into function calls or completely parsed.
+    '''
+    items = []
+    is_tokens = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token == '(':
+            group_items, group_is_tokens, position = parse_level(tokens, position)
+            # A name followed by parentheses is a function.
+            if (is_tokens and is_tokens[-1] and isinstance(items[-1], str) and
+                    items[-1][0].isalpha()):
+                items[-1] = make_function(items[-1], group_items, group_is_tokens)
+                is_tokens[-1] = False
+            else:
+                items.append(finish_level(group_items, group_is_tokens))
+                is_tokens.append(False)
+        elif token == ')':
+            break
+        else:
+            number = as_number(token)
+            if number is None:
+                items.append(token)
+                is_tokens.append(True)
+            else:
+                items.append(number)
+                is_tokens.append(False)
+    return items, is_tokens, position
+
+
+def make_function(name, items, is_tokens):
+    '''
+    Create a Function from the items in its parentheses by splitting them into
+    arguments at the commas.
+    A registered function with numeric arguments is evaluated straight away
+    and the number is returned instead.
+
+    >>> make_function('logceil', [5], [False])
+    3
+    >>> make_function('logceil', ['fish'], [True])
+    Function(name='logceil', arguments=('fish',))
+    '''
+    arguments = []
+    argument = []
+    argument_is_tokens = []
+
+    def add_argument(argument, argument_is_tokens):
+        assert len(argument) > 0
+        if len(argument) == 1:
+            arguments.append(argument[0])
+        else:
+            arguments.append(finish_level(argument, argument_is_tokens))
+
+    for item, is_token in zip(items, is_tokens):
+        if is_token and item == ',':
+            add_argument(argument, argument_is_tokens)
+            argument = []
+            argument_is_tokens = []
+        else:
+            argument.append(item)
+            argument_is_tokens.append(is_token)
+    add_argument(argument, argument_is_tokens)
+    function = REGISTERED_FUNCTIONS.get(name)
+    if (function is not None) and all(isinstance(arg, (int, float)) for arg in arguments):
+        try:
+            return function(*arguments)
+        except Exception:
+            # Leave the error to be reported when the expression is simplified.
+            pass
+    return Function(name=name, arguments=tuple(arguments))
+
+
+def finish_level(items, is_tokens):
+    '''
+    Group the items in a level into multiplications and then additions.
+    Any parentheses and functions in the level have already been parsed.
+    '''
+    parsed = []
+    possible_multiplication = []
+    for item, is_token in zip(items, is_tokens):
+        if is_token and item in ('-', '+'):
+            parsed += Expression.finish_multiplication_term(possible_multiplication)
+            possible_multiplication = []
+            parsed.append(item)
+        else:
+            possible_multiplication.append(item)
+    parsed += Expression.finish_multiplication_term(possible_multiplication)
+    if len(parsed) == 1:
+        o = parsed[0]
+    else:
+        o = Expression.finish_addition(parsed)
+    return o
+
+
+def parse(item):
+    '''
+    Parse a tokenized string wrapped in an `Expression`.
+    '''
+    return parse_tokens(list(item.items))
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_and_simplify(s):
     '''
     Tokenize, parse and simplify a string.
+    The results are cached.  The cache is cleared when a function is registered.
     '''
     if s == '':
         raise ValueError('Cannot parse an empty string')
@@ -976,7 +985,4 @@ if __name__ == '__main__':
     #import doctest
     #doctest.testmod()
     s = 'minimum(1, 2) - 2'
-    e = Expression(tokenize_string(s))
-    parsed_parentheses = e.parse_parentheses()
-    parsed_functions = parsed_parentheses.parse_functions()
-    print(parsed_functions)
+    print(parse_string(s))
@@ -1,4 +1,7 @@
+import collections
+import heapq
 import logging
+from types import MappingProxyType
 
 from slvcodec import math_parser, typs, typ_parser, dependencies
 
@@ -12,6 +15,8 @@ class Use:
     '''
     Defines a package dependency for a package or entity.
     '''
+    __slots__ = ('library', 'design_unit', 'name_within', 'package')
+
     def __init__(self, library, design_unit, name_within, package=None):
         self.library = library
         self.design_unit = design_unit
@@ -25,6 +30,7 @@ class Package(object):
     The dependencies of the types and constants on other packages have
     been resolved.
     '''
+    __slots__ = ('identifier', 'types', 'constants', 'uses')
 
     resolved = True
 
@@ -41,7 +47,8 @@ class Package(object):
         return str(self)
 
 
-BUILTIN_PACKAGES = {
+# Read-only so that resolving packages cannot accidentally add to it.
+BUILTIN_PACKAGES = MappingProxyType({
     'std_logic_1164': Package(
         identifier='std_logic_1164', constants={}, types={
             'std_logic_vector': typs.StdLogicVector(),
@@ -58,7 +65,7 @@ BUILTIN_PACKAGES = {
     'textio': Package(
         identifier='textio', constants={}, types={
         }, uses={}),
-}
+})
 
 
 def resolve_packages(packages):
@@ -67,27 +74,45 @@ def resolve_packages(packages):
     to one another.
     Returns a dictionary of resolved packages.
     '''
-    package_dict = dict([(p.identifier, p) for p in packages])
-    resolved_pd = BUILTIN_PACKAGES.copy()
-    resolved_package_names = list(STANDARD_PACKAGES)
-    toresolve_package_names = [p.identifier for p in packages]
-    while toresolve_package_names:
-        any_resolved = False
-        for pn in toresolve_package_names:
-            dependencies = package_dict[pn].uses.keys()
-            if not (set(dependencies) - set(resolved_package_names)):
-                resolved = package_dict[pn].resolve(resolved_pd)
-                any_resolved = True
-                resolved_package_names.append(pn)
-                resolved_pd[pn] = resolved
-            else:
-                logger.debug('Trying to resolve %s but has unresolved dependencies %s',
-                             pn, set(dependencies) - set(resolved_package_names))
-        toresolve_package_names = [x for x in toresolve_package_names
-                                   if x not in resolved_package_names]
-        if not any_resolved:
-            raise Exception('Failing to resolve packages {}'.format(
-                toresolve_package_names))
+    package_dict = {p.identifier: p for p in packages}
+    resolved_pd = dict(BUILTIN_PACKAGES)
+    # Package names in the order they were given, without repeats.
+    toresolve_package_names = list(dict.fromkeys(p.identifier for p in packages))
+    positions = {pn: index for index, pn in enumerate(toresolve_package_names)}
+    # For each package the dependencies that still need resolving, and for each
+    # package the packages that are waiting on it.
+    remaining_dependencies = {}
+    dependents = collections.defaultdict(list)
+    for pn in toresolve_package_names:
+        remaining = set(package_dict[pn].uses.keys()) - set(STANDARD_PACKAGES)
+        remaining_dependencies[pn] = remaining
+        for dependency in remaining:
+            dependents[dependency].append(pn)
+    # Packages are resolved in the same order as repeatedly sweeping through the
+    # list and resolving whatever is ready.  A package that becomes ready is
+    # resolved in the current sweep if it comes later in the list, otherwise
+    # in the next one.
+    ready = [(0, positions[pn]) for pn in toresolve_package_names
+             if not remaining_dependencies[pn]]
+    heapq.heapify(ready)
+    while ready:
+        sweep, position = heapq.heappop(ready)
+        pn = toresolve_package_names[position]
+        resolved_pd[pn] = package_dict[pn].resolve(resolved_pd)
+        del remaining_dependencies[pn]
+        for dependent in dependents[pn]:
+            remaining = remaining_dependencies[dependent]
+            remaining.discard(pn)
+            if not remaining:
+                dependent_position = positions[dependent]
+                dependent_sweep = sweep if dependent_position > position else sweep + 1
+                heapq.heappush(ready, (dependent_sweep, dependent_position))
+    if remaining_dependencies:
+        for pn, remaining in remaining_dependencies.items():
+            logger.debug('Trying to resolve %s but has unresolved dependencies %s',
+                         pn, remaining)
+        raise Exception('Failing to resolve packages {}'.format(
+            list(remaining_dependencies.keys())))
     return resolved_pd
 
 
@@ -109,9 +134,13 @@ def combine_packages(packages):
     '''
     combined_types = {}
     combined_constants = {}
+    # Update the combined dictionaries in place rather than copying them for
+    # each package.
     for p in packages:
-        combined_types = exclusive_dict_merge(combined_types, p.types)
-        combined_constants = exclusive_dict_merge(combined_constants, p.constants)
+        assert not (combined_types.keys() & p.types.keys())
+        combined_types.update(p.types)
+        assert not (combined_constants.keys() & p.constants.keys())
+        combined_constants.update(p.constants)
     return combined_types, combined_constants
 
 
@@ -123,10 +152,11 @@ def resolve_uses(uses, packages, must_resolve=True):
     '''
     resolved_uses = {}
     for use_name, use in uses.items():
-        if use_name not in packages:
+        used_package = packages.get(use_name)
+        if used_package is None:
             if must_resolve:
                 raise Exception('Did not find dependency package {}'.format(use_name))
-        elif not packages[use_name].resolved:
+        elif not used_package.resolved:
             if must_resolve:
                 raise Exception('Dependency package {} is not resolved'.format(use_name))
         else:
@@ -134,7 +164,7 @@ def resolve_uses(uses, packages, must_resolve=True):
                 library=use.library,
                 design_unit=use.design_unit,
                 name_within=use.name_within,
-                package=packages[use_name],
+                package=used_package,
             )
     return resolved_uses
 
@@ -145,14 +175,30 @@ class UnresolvedPackage:
     The dependencies of the types and constants on other packages have
     not yet been resolved.
     '''
+    __slots__ = ('identifier', 'types', 'constants', 'uses', 'resolution',
+                 'constant_dependencies', 'type_dependencies')
 
     def __init__(self, identifier, types, constants, uses):
         self.identifier = identifier
         self.types = types
         self.constants = constants
         self.uses = uses
+        # The packages used in the last resolution and the resulting package.
+        self.resolution = None
+        # The names each constant and type depend on.  They don't change so they
+        # are worked out on the first resolve and then reused.
+        self.constant_dependencies = None
+        self.type_dependencies = None
 
     def resolve(self, packages):
+        # Parsed packages are cached and resolved again for each testbench, so
+        # reuse the last result if it was resolved against the same packages.
+        used_packages = tuple(packages.get(use_name) for use_name in self.uses)
+        if self.resolution is not None:
+            previous_packages, previous = self.resolution
+            if (len(previous_packages) == len(used_packages)) and all(
+                    a is b for a, b in zip(previous_packages, used_packages)):
+                return previous
         resolved_uses = resolve_uses(self.uses, packages)
         available_types, available_constants = combine_packages(
             [u.package for u in resolved_uses.values()])
@@ -163,13 +209,14 @@ class UnresolvedPackage:
             resolved_constant = typs.Constant(name=name, expression=resolved)
             return resolved_constant
 
-        constant_dependencies = dict([
-            (name, math_parser.get_constant_list(c))
-            for name, c in self.constants.items()])
+        if self.constant_dependencies is None:
+            self.constant_dependencies = {
+                name: frozenset(math_parser.get_constant_list(c))
+                for name, c in self.constants.items()}
         resolved_constants, failed_constants = dependencies.resolve_dependencies(
             available=available_constants,
             unresolved=self.constants,
-            dependencies=constant_dependencies,
+            dependencies=self.constant_dependencies,
             resolve_function=resolve_constant,
         )
 
@@ -179,12 +226,13 @@ class UnresolvedPackage:
             resolved = typ.resolve(resolved_types, available_constants)
             return resolved
 
-        type_dependencies = dict([
-            (name, t.type_dependencies) for name, t in self.types.items()])
+        if self.type_dependencies is None:
+            self.type_dependencies = {
+                name: frozenset(t.type_dependencies) for name, t in self.types.items()}
         resolved_types, failed_types = dependencies.resolve_dependencies(
             available=available_types,
             unresolved=self.types,
-            dependencies=type_dependencies,
+            dependencies=self.type_dependencies,
             resolve_function=resolve_type,
         )
 
@@ -194,4 +242,5 @@ class UnresolvedPackage:
             constants=resolved_constants,
             uses=resolved_uses,
         )
+        self.resolution = (used_packages, p)
         return p
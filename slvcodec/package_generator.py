@@ -3,12 +3,10 @@ Functions to generate packages from existing packages that define types to
 convert the types back and forth to std_logic_vector.
 '''
 
-import os
+import functools
 import logging
 
-import jinja2
-
-from slvcodec import typs, math_parser
+from slvcodec import typs, math_parser, config
 
 
 logger = logging.getLogger(__name__)
@@ -23,6 +21,34 @@ width_declarations_template = '''  constant {type.identifier}_slvcodecwidth: nat
 functions_declarations_template = '''  function to_slvcodec (constant data: {type.identifier}) return std_logic_vector;
   function from_slvcodec (constant slv: std_logic_vector) return {type.identifier};'''
 
+package_template = '''{library_lines}
+{use_lines}
+
+package {package_name} is
+
+{declarations}
+
+end package;
+'''
+
+package_body_template = '''
+package body {package_name} is
+
+{definitions}
+
+end package body;
+'''
+
+
+@functools.lru_cache(maxsize=4096)
+def width_string(typ):
+    '''
+    The width of a type as a VHDL expression.
+    Types are shared between records and arrays so each is only converted once.
+    Types hash by identity so the cache is bounded to let old types be freed.
+    '''
+    return math_parser.str_expression(typ.width)
+
 
 def make_record_declarations_and_definitions(record_type):
     '''
@@ -31,17 +57,14 @@ def make_record_declarations_and_definitions(record_type):
     '''
     declarations = declarations_template.format(
         type=record_type,
-        width_expression=math_parser.str_expression(record_type.width),
+        width_expression=width_string(record_type),
     )
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                               'slvcodec_record_template.vhd')
-    with open(template_fn, 'r') as f:
-        definitions_template = jinja2.Template(f.read())
-        indices_names_and_widths = []
+    definitions_template = config.template_env.get_template('slvcodec_record_template.vhd')
+    indices_names_and_widths = []
     for index, name_and_subtype in enumerate(record_type.names_and_subtypes):
         name, subtype = name_and_subtype
         indices_names_and_widths.append(
-            (index, name, math_parser.str_expression(subtype.width)))
+            (index, name, width_string(subtype)))
     definitions = definitions_template.render(
         type=record_type.identifier,
         indices_names_and_widths=indices_names_and_widths)
@@ -55,17 +78,15 @@ def make_enumeration_declarations_and_definitions(enumeration_type):
     '''
     declarations = declarations_template.format(
         type=enumeration_type,
-        width_expression=math_parser.str_expression(enumeration_type.width),
+        width_expression=width_string(enumeration_type),
+    )
+    definitions_template = config.template_env.get_template(
+        'slvcodec_enumeration_template.vhd')
+    definitions = definitions_template.render(
+        type=enumeration_type.identifier,
+        literals=enumeration_type.literals,
+        n_literals=len(enumeration_type.literals),
     )
-    template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                               'slvcodec_enumeration_template.vhd')
-    with open(template_fn, 'r') as f:
-        definitions_template = jinja2.Template(f.read())
-        definitions = definitions_template.render(
-            type=enumeration_type.identifier,
-            literals=enumeration_type.literals,
-            n_literals=len(enumeration_type.literals),
-        )
     return declarations, definitions
 
 
@@ -75,14 +96,13 @@ def make_array_declarations_and_definitions(array_type):
     array types.
     '''
     if hasattr(array_type, 'size'):
-        width_expression = math_parser.str_expression(array_type.width)
+        width_expression = width_string(array_type)
         width_declaration = width_declarations_template.format(
             type=array_type,
             width_expression=width_expression,
         )
         if array_type.unconstrained_type.identifier is None:
-            subtype_width = math_parser.str_expression(
-                array_type.unconstrained_type.subtype.width)
+            subtype_width = width_string(array_type.unconstrained_type.subtype)
             unconstrained = False
         else:
             # We don't need to define functions because it's not a new kind of
@@ -92,8 +112,7 @@ def make_array_declarations_and_definitions(array_type):
         width_declaration = ''
         unconstrained = True
         if array_type.subtype.identifier is None:
-            subtype_width = math_parser.str_expression(
-                array_type.subtype.width)
+            subtype_width = width_string(array_type.subtype)
         else:
             subtype_width = array_type.subtype.identifier + '_slvcodecwidth'
 
@@ -106,10 +125,8 @@ def make_array_declarations_and_definitions(array_type):
         functions_declarations = functions_declarations_template.format(
             type=array_type)
         declarations = '\n'.join([width_declaration, functions_declarations])
-        template_fn = os.path.join(os.path.dirname(__file__), 'templates',
-                                   'slvcodec_array_template.vhd')
-        with open(template_fn, 'r') as template_file:
-            definitions_template = jinja2.Template(template_file.read())
+        definitions_template = config.template_env.get_template(
+            'slvcodec_array_template.vhd')
         definitions = definitions_template.render(
             type=array_type.identifier,
             subtype_width=subtype_width,
@@ -118,19 +135,28 @@ def make_array_declarations_and_definitions(array_type):
     return declarations, definitions
 
 
+# The function that creates the declarations and definitions for each type.
+# Types are matched exactly since subclasses such as StdLogicVector are handled
+# differently.
+_DISPATCH = {
+    typs.Array: make_array_declarations_and_definitions,
+    typs.ConstrainedArray: make_array_declarations_and_definitions,
+    typs.ConstrainedStdLogicVector: make_array_declarations_and_definitions,
+    typs.ConstrainedUnsigned: make_array_declarations_and_definitions,
+    typs.ConstrainedSigned: make_array_declarations_and_definitions,
+    typs.Record: make_record_declarations_and_definitions,
+    typs.Enumeration: make_enumeration_declarations_and_definitions,
+}
+
+
 def make_declarations_and_definitions(typ):
     '''
     Create declarations and definitions of functions to convert to and from
     array and record types.  Other types are not yet supported.
     '''
-    if type(typ) in (typs.Array, typs.ConstrainedArray,
-                     typs.ConstrainedStdLogicVector, typs.ConstrainedUnsigned,
-                     typs.ConstrainedSigned):
-        d_and_d = make_array_declarations_and_definitions(typ)
-    elif isinstance(typ, typs.Record):
-        d_and_d = make_record_declarations_and_definitions(typ)
-    elif isinstance(typ, typs.Enumeration):
-        d_and_d = make_enumeration_declarations_and_definitions(typ)
+    function = _DISPATCH.get(type(typ))
+    if function is not None:
+        d_and_d = function(typ)
     else:
         logger.warning('Dont know how to slvcodec functions for {}.'.format(typ))
         d_and_d = '', ''
@@ -169,22 +195,6 @@ def make_slvcodec_package(pkg):
     use_lines.append('use work.{}.all;'.format(pkg.identifier))
     use_lines.append('use work.slvcodec.all;'.format(pkg.identifier))
     library_lines = ['library {};'.format(library) for library in libraries]
-    package_template = """{library_lines}
-{use_lines}
-
-package {package_name} is
-
-{declarations}
-
-end package;
-"""
-    package_body_template = """
-package body {package_name} is
-
-{definitions}
-
-end package body;
-"""
     slvcodec_pkg = package_template.format(
         library_lines='\n'.join(library_lines),
         use_lines='\n'.join(use_lines),
@@ -1,7 +1,11 @@
+import hashlib
 import logging
 import collections
+import os
+import pickle
+import tempfile
 
-from slvcodec import inner_vhdl_parser, package
+from slvcodec import config, inner_vhdl_parser, package
 from slvcodec import math_parser, typ_parser
 from slvcodec import entity, typs
 
@@ -72,7 +76,7 @@ def process_parsed_package(parsed_package, parsed_uses):
     processed_types = [(t.identifier, typ_parser.process_parsed_type(t))
                        for t in p_types]
     # Filter out the types that could not be processed.
-    types = dict([(k, v) for k, v in processed_types if v is not None])
+    types = {k: v for k, v in processed_types if v is not None}
     failed_type_keys = [k for k, v in processed_types if v is None]
     if failed_type_keys:
         logger.warning('Failed to parse types %s', str(failed_type_keys))
@@ -218,6 +222,110 @@ def parse_file(filename):
     return parsed_entities, parsed_packages
 
 
+try:
+    # Written by setuptools_scm when the package is installed.
+    from slvcodec.version import version as PACKAGE_VERSION
+except ImportError:
+    PACKAGE_VERSION = 'unknown'
+
+# Files in config.parse_cache_directory are only reused by the same version of slvcodec
+# writing the same pickle protocol.
+PARSE_CACHE_VERSION = '{}-{}'.format(PACKAGE_VERSION, pickle.DEFAULT_PROTOCOL)
+
+
+def update_with_code(hasher, code):
+    '''
+    Add a compiled function body, including any nested functions, to a hash.
+    '''
+    hasher.update(code.co_code)
+    hasher.update(repr(code.co_names).encode())
+    for constant in code.co_consts:
+        if isinstance(constant, type(code)):
+            update_with_code(hasher, constant)
+        else:
+            hasher.update(repr(constant).encode())
+
+
+def parse_cache_filename(filename):
+    '''
+    The file in `config.parse_cache_directory` where the parsed contents of `filename`
+    are stored.  The name depends on the contents of the file and on the registered
+    math functions, since those are evaluated while parsing.  A function is identified
+    by its module, its qualified name and its code, so redefining a function under
+    the same name does not reuse stale results.
+    '''
+    hasher = hashlib.sha1()
+    hasher.update(PARSE_CACHE_VERSION.encode())
+    with open(filename, 'rb') as f:
+        hasher.update(f.read())
+    for name, function in sorted(math_parser.REGISTERED_FUNCTIONS.items()):
+        hasher.update(repr((name, getattr(function, '__module__', None),
+                            getattr(function, '__qualname__', None))).encode())
+        code = getattr(function, '__code__', None)
+        if code is not None:
+            update_with_code(hasher, code)
+    return os.path.join(config.parse_cache_directory,
+                        'parsed_{}.pickle'.format(hasher.hexdigest()))
+
+
+def parse_file_with_disk_cache(filename):
+    '''
+    Parse a file, reusing the result from `config.parse_cache_directory` if the file
+    has been parsed before.
+    '''
+    if config.parse_cache_directory is None:
+        return parse_file(filename)
+    cache_filename = parse_cache_filename(filename)
+    if os.path.exists(cache_filename):
+        try:
+            with open(cache_filename, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning('Failed to load parse cache {}: {}'.format(cache_filename, e))
+    parsed = parse_file(filename)
+    temporary_filename = None
+    try:
+        os.makedirs(config.parse_cache_directory, exist_ok=True)
+        # Write to a temporary file first so that a partially written cache file is
+        # never read.
+        with tempfile.NamedTemporaryFile(
+                dir=config.parse_cache_directory, delete=False) as f:
+            temporary_filename = f.name
+            pickle.dump(parsed, f, protocol=pickle.DEFAULT_PROTOCOL)
+        os.replace(temporary_filename, cache_filename)
+    except Exception as e:
+        logger.warning('Failed to write parse cache {}: {}'.format(cache_filename, e))
+        if (temporary_filename is not None) and os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+    return parsed
+
+
+# The (mtime, size) and parsed (entities, packages) of each file, keyed by filename, so
+# that unchanged files are not parsed again by parse_and_resolve_files or
+# filetestbench_generator.process_files.
+_PARSE_CACHE = {}
+
+
+def parse_file_if_changed(filename):
+    '''
+    Parse entity and package objects from a file, reusing the previous result if
+    the file has not changed since it was last parsed.
+    Only the latest parse of each file is kept.
+
+    The returned lists are new but the entity and package objects in them are shared
+    with earlier callers.  This is what lets a package reuse its previous resolution
+    when it is resolved against the same packages again, so they should not be modified.
+    '''
+    st = os.stat(filename)
+    file_state = (st.st_mtime_ns, st.st_size)
+    cached = _PARSE_CACHE.get(filename)
+    if (cached is None) or (cached[0] != file_state):
+        cached = (file_state, parse_file_with_disk_cache(filename))
+        _PARSE_CACHE[filename] = cached
+    parsed_entities, parsed_packages = cached[1]
+    return list(parsed_entities), list(parsed_packages)
+
+
 def resolve_entities_and_packages(entities, packages, must_resolve=True):
     '''
     Resolve references in entity and package objects.
@@ -245,7 +353,7 @@ def parse_and_resolve_files(filenames, must_resolve=True, ignore_parse_exception
     all_packages = []
     for filename in filenames:
         try:
-            entities, packages = parse_file(filename)
+            entities, packages = parse_file_if_changed(filename)
             all_entities += entities
             all_packages += packages
         except Exception as e:
@@ -3,7 +3,7 @@ import os
 import random
 import shutil
 
-from slvcodec import filetestbench_generator
+from slvcodec import filetestbench_generator, generator_utils
 from slvcodec import entity, package, typs, config, vhdl_parser
 
 vhdl_dir = os.path.join(os.path.dirname(__file__),  'vhdl')
@@ -70,6 +70,46 @@ def test_conversion():
         assert obj == d 
 
 
+def test_quote_generics():
+    generics = {
+        'length': 3,
+        'name': 'fish',
+        'already_quoted': '"bear"',
+        'character': "'1'",
+        'empty': '',
+    }
+    quoted = generator_utils.quote_generics(generics)
+    assert quoted == {
+        'length': 3,
+        'name': '"fish"',
+        'already_quoted': '"bear"',
+        'character': "'1'",
+        'empty': '',
+    }
+    # The original dictionary is not modified.
+    assert generics['name'] == 'fish'
+
+
+def test_prepare_files_batch():
+    output_dir = os.path.join(testoutput_dir, 'test_prepare_files_batch')
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    filenames = [os.path.join(vhdl_dir, 'dummy.vhd'),
+                 os.path.join(vhdl_dir, 'vhdl_type_pkg.vhd')]
+    jobs = []
+    for use_vunit in (True, False):
+        directory = os.path.join(output_dir, 'vunit' if use_vunit else 'no_vunit')
+        os.makedirs(directory)
+        jobs.append((directory, filenames, 'dummy', {'use_vunit': use_vunit}))
+    results = filetestbench_generator.prepare_files_batch(jobs, max_workers=2)
+    assert len(results) == len(jobs)
+    for (directory, _, _, _), (tb_fns, dut_fns, resolved) in zip(jobs, results):
+        assert tb_fns[-1] == os.path.join(directory, 'dummy_tb.vhd')
+        assert os.path.exists(tb_fns[-1])
+        assert dut_fns == filenames
+        assert 'dummy' in resolved['entities']
+
+
 if __name__ == '__main__':
     config.setup_logging(logging.DEBUG)
     #test_conversion()
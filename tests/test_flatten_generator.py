@@ -0,0 +1,70 @@
+from slvcodec import flatten_generator, package, vhdl_parser
+
+NESTED_PKG = '''
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
+
+package nested_pkg is
+  constant WIDTH: natural := 3;
+  type t_pair is
+    record
+      a: unsigned(WIDTH-1 downto 0);
+      b: std_logic;
+    end record;
+  type array_of_pair is array(integer range <>) of t_pair;
+  type t_holder is
+    record
+      pairs: array_of_pair(1 downto 0);
+      flag: std_logic;
+    end record;
+  type array_of_holder is array(integer range <>) of t_holder;
+  subtype t_holders is array_of_holder(1 downto 0);
+  type array_of_pairs is array(integer range <>) of array_of_pair(1 downto 0);
+  subtype t_grid is array_of_pairs(2 downto 0);
+end package;
+'''
+
+
+def get_nested_types():
+    entities, packages = vhdl_parser.parse_string(NESTED_PKG)
+    return package.resolve_packages(packages)['nested_pkg'].types
+
+
+def flattened_names_and_types(typ):
+    return [(hierarchy, str(subtype))
+            for hierarchy, subtype in flatten_generator.flatten_type(typ)]
+
+
+def test_flatten_array_in_record():
+    types = get_nested_types()
+    assert flattened_names_and_types(types['t_holder']) == [
+        (['pairs', 0, 'a'], 'unsigned(width-1 downto 0)'),
+        (['pairs', 0, 'b'], 'std_logic'),
+        (['pairs', 1, 'a'], 'unsigned(width-1 downto 0)'),
+        (['pairs', 1, 'b'], 'std_logic'),
+        (['flag'], 'std_logic'),
+        ]
+
+
+def test_flatten_record_in_array():
+    types = get_nested_types()
+    flattened = flattened_names_and_types(types['t_holders'])
+    assert [hierarchy for hierarchy, subtype in flattened] == [
+        [index] + hierarchy
+        for index in range(2)
+        for hierarchy in (['pairs', 0, 'a'], ['pairs', 0, 'b'], ['pairs', 1, 'a'],
+                          ['pairs', 1, 'b'], ['flag'])
+        ]
+    assert flattened[:5] == [([0] + hierarchy, subtype) for hierarchy, subtype in
+                             flattened_names_and_types(types['t_holder'])]
+
+
+def test_flatten_array_of_arrays():
+    types = get_nested_types()
+    assert flattened_names_and_types(types['t_grid']) == [
+        ([outer, inner, name], subtype)
+        for outer in range(3)
+        for inner in range(2)
+        for name, subtype in (('a', 'unsigned(width-1 downto 0)'), ('b', 'std_logic'))
+        ]
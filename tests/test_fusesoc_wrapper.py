@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+from unittest import mock
+
+import pytest
+
+from slvcodec import fusesoc_wrapper
+
+testoutput_dir = os.path.join(os.path.dirname(__file__), 'test_output')
+
+
+def test_extract_generics():
+    error_lines = [
+        'ghdl:info: simulation started\n',
+        'generated.vhd:12:5:@0ms:(report note): Generator name=adder width=4 n_inputs=2\n',
+        'generated.vhd:20:5:@0ms:(report note): Generator name=delay length=3\n',
+        'generated.vhd:28:5:@0ms:(report note): Generator\n',
+        ]
+    ds = fusesoc_wrapper.extract_generics(error_lines)
+    # One dictionary for each generator line that has parameters.
+    assert ds == [
+        {'name': 'adder', 'width': '4', 'n_inputs': '2'},
+        {'name': 'delay', 'length': '3'},
+        ]
+    for bad_line in ('Generator name=adder width\n', 'Generator name=adder name=delay\n'):
+        with pytest.raises(ValueError):
+            fusesoc_wrapper.extract_generics([bad_line])
+
+
+def make_vhdl_files(output_dir, names):
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    filenames = []
+    for name in names:
+        filename = os.path.join(output_dir, name + '.vhd')
+        with open(filename, 'w') as f:
+            f.write('-- {}\n'.format(name))
+        filenames.append(filename)
+    return filenames
+
+
+def analyzed_files(check_call):
+    """
+    The lists of files passed to each of the stubbed 'ghdl -a' calls.
+    """
+    return [call_args[0][0][3:] for call_args in check_call.call_args_list]
+
+
+def test_compile_src_files_skips_unchanged_prefix():
+    output_dir = os.path.join(testoutput_dir, 'test_compile_src_files_skips_unchanged_prefix')
+    filenames = make_vhdl_files(output_dir, ['a', 'b', 'c'])
+    compiled_files = []
+    with mock.patch.object(fusesoc_wrapper.subprocess, 'check_call') as check_call:
+        fusesoc_wrapper.compile_src_files(output_dir, filenames, compiled_files)
+        assert analyzed_files(check_call) == [filenames]
+        assert [filename for filename, digest in compiled_files] == filenames
+        # Nothing has changed so nothing is analyzed again.
+        check_call.reset_mock()
+        fusesoc_wrapper.compile_src_files(output_dir, filenames, compiled_files)
+        assert analyzed_files(check_call) == []
+        # A changed file is analyzed again along with every file after it.
+        with open(filenames[1], 'a') as f:
+            f.write('-- changed\n')
+        check_call.reset_mock()
+        fusesoc_wrapper.compile_src_files(output_dir, filenames, compiled_files)
+        assert analyzed_files(check_call) == [filenames[1:]]
+        assert compiled_files[1] == (filenames[1], fusesoc_wrapper.file_digest(filenames[1]))
+
+
+def test_compile_src_files_failed_batch():
+    output_dir = os.path.join(testoutput_dir, 'test_compile_src_files_failed_batch')
+    filenames = make_vhdl_files(output_dir, ['a', 'bad', 'c'])
+
+    def check_call(args, **kwargs):
+        if filenames[1] in args:
+            raise subprocess.CalledProcessError(1, args)
+
+    with mock.patch.object(fusesoc_wrapper.subprocess, 'check_call',
+                           side_effect=check_call) as stubbed:
+        with pytest.raises(RuntimeError) as excinfo:
+            fusesoc_wrapper.compile_src_files(output_dir, filenames)
+    # The failing batch is analyzed again one file at a time so that the error
+    # names the file that failed.
+    assert analyzed_files(stubbed) == [filenames, filenames[:1], filenames[1:2]]
+    assert str(excinfo.value) == 'Failed to analyze {}'.format(filenames[1])
@@ -1,3 +1,5 @@
+import pickle
+
 import pytest
 
 from slvcodec import math_parser as sm
@@ -57,3 +59,66 @@ def test_fails_on_power():
         simplified = sm.parse_and_simplify(string)
     message = e.value.args[0]
     assert all([s in message for s in ('**', 'power')])
+
+
+def test_tokenize_string():
+    ins_and_outs = (
+        ('logceil(5+3)-2', ['logceil', '(', '5', '+', '3', ')', '-', '2']),
+        ('3 * 2 / fish', ['3', '*', '2', '/', 'fish']),
+        ('minimum(width_a, 6.2)', ['minimum', '(', 'width_a', ',', '6.2', ')']),
+        ('1_000 + 2 ** 3', ['1_000', '+', '2', '**', '3']),
+        ('"0101"', ['"0101"']),
+        ("'1'", ["'1'"]),
+        ("(others => '0')", ['(', 'others', '=', '>', "'0'", ')']),
+        ('2#1010# + 16#FF#', ['2#1010#', '+', '16#FF#']),
+        )
+    for in_string, expected_tokens in ins_and_outs:
+        assert sm.tokenize_string(in_string) == expected_tokens
+
+
+def test_fails_on_unbalanced_parentheses():
+    for string in ('(fish + 1', 'fish + 1)'):
+        with pytest.raises(sm.MathParsingError):
+            sm.parse_string(string)
+
+
+def test_register_function_after_parse():
+    string = 'test_triple(4) + 1'
+    before = sm.parse_and_simplify(string)
+    assert sm.str_expression(before) == '(test_triple(4)+1)'
+    assert sm.parse_string('test_triple(4)').name == 'test_triple'
+    sm.register_function('test_triple', lambda x: 3 * x)
+    try:
+        # The cached results from before the function was registered are not reused.
+        assert sm.parse_and_simplify(string) == 13
+        assert sm.parse_string('test_triple(4)') == 12
+    finally:
+        del sm.REGISTERED_FUNCTIONS['test_triple']
+        sm.parse_string.cache_clear()
+        sm.parse_and_simplify.cache_clear()
+
+
+def test_function_construction_is_not_folded():
+    function = sm.Function(name='logceil', arguments=(5,))
+    assert isinstance(function, sm.Function)
+    assert pickle.loads(pickle.dumps(function)) == function
+    assert sm.simplify(function) == 3
+    # Parsing still folds registered functions with numeric arguments.
+    assert sm.parse_string('logceil(5)') == 3
+
+
+def test_function_errors_are_not_raised_while_parsing():
+    def only_positive(x):
+        if x <= 0:
+            raise ValueError('only_positive needs a positive argument')
+        return x
+    sm.register_function('test_only_positive', only_positive)
+    try:
+        parsed = sm.parse_string('test_only_positive(0)')
+        assert isinstance(parsed, sm.Function)
+        with pytest.raises(ValueError):
+            sm.simplify(parsed)
+    finally:
+        del sm.REGISTERED_FUNCTIONS['test_only_positive']
+        sm.parse_string.cache_clear()
+        sm.parse_and_simplify.cache_clear()
@@ -1,7 +1,10 @@
+import collections
 import logging
 import os
 
-from slvcodec import package, config, vhdl_parser
+import pytest
+
+from slvcodec import package, config, vhdl_parser, dependencies
 
 vhdl_dir = os.path.join(os.path.dirname(__file__),  'vhdl')
 
@@ -16,6 +19,117 @@ def test_dummy_width():
     assert aau.width.value() == 6*6*4
 
 
+def test_resolve_reuses_previous_resolution():
+    filename = os.path.join(vhdl_dir, 'vhdl_type_pkg.vhd')
+    entities, packages = vhdl_parser.parse_file(filename)
+    first = package.resolve_packages(packages)
+    second = package.resolve_packages(packages)
+    assert second['vhdl_type_pkg'] is first['vhdl_type_pkg']
+    # Freshly parsed packages are resolved again.
+    entities, packages = vhdl_parser.parse_file(filename)
+    third = package.resolve_packages(packages)
+    assert third['vhdl_type_pkg'] is not first['vhdl_type_pkg']
+
+
+class FakePackage:
+    """
+    Records the order in which packages are resolved.
+    """
+
+    def __init__(self, identifier, uses, resolved_order):
+        self.identifier = identifier
+        self.uses = {name: None for name in uses}
+        self.resolved_order = resolved_order
+
+    def resolve(self, packages):
+        for name in self.uses:
+            assert name in packages
+        self.resolved_order.append(self.identifier)
+        return self.identifier
+
+
+def make_fake_packages(uses):
+    resolved_order = []
+    packages = [FakePackage(identifier, package_uses, resolved_order)
+                for identifier, package_uses in uses]
+    return packages, resolved_order
+
+
+def test_resolve_packages_order():
+    # 'c' is only ready after 'a' which comes later in the list, so it waits for the
+    # next sweep.  'd' is ready as soon as 'b' is resolved earlier in the same sweep.
+    packages, resolved_order = make_fake_packages([
+        ('c', ['a']), ('a', ['std_logic_1164']), ('b', []), ('d', ['b']),
+        ])
+    resolved = package.resolve_packages(packages)
+    assert resolved_order == ['a', 'b', 'd', 'c']
+    assert {'a', 'b', 'c', 'd'} <= set(resolved.keys())
+
+
+def test_resolve_packages_failures():
+    # A missing package fails the packages using it, and those using them.
+    packages, resolved_order = make_fake_packages([
+        ('a', ['missing']), ('b', ['a']), ('c', []),
+        ])
+    with pytest.raises(Exception) as excinfo:
+        package.resolve_packages(packages)
+    assert "['a', 'b']" in str(excinfo.value)
+    assert resolved_order == ['c']
+    # Packages in a cycle are never resolved.
+    packages, resolved_order = make_fake_packages([('x', ['y']), ('y', ['x'])])
+    with pytest.raises(Exception) as excinfo:
+        package.resolve_packages(packages)
+    assert "['x', 'y']" in str(excinfo.value)
+    assert resolved_order == []
+
+
+def resolve_with_dependencies(available, item_dependencies, fail_names=()):
+    resolved_order = []
+
+    def resolve_function(name, item, resolved_items):
+        for dependency in item_dependencies[name]:
+            assert dependency in resolved_items
+        if name in fail_names:
+            raise ValueError('Cannot resolve {}'.format(name))
+        resolved_order.append(name)
+        return item.upper()
+
+    unresolved = {name: name for name in item_dependencies}
+    resolved, failed = dependencies.resolve_dependencies(
+        available=available, unresolved=unresolved, dependencies=item_dependencies,
+        resolve_function=resolve_function)
+    return resolved, failed, resolved_order
+
+
+def test_resolve_dependencies_order():
+    item_dependencies = collections.OrderedDict([
+        ('c', ['a']), ('a', ['known']), ('b', []), ('d', ['b', 'c']),
+        ])
+    resolved, failed, resolved_order = resolve_with_dependencies(
+        {'known': 'KNOWN'}, item_dependencies)
+    assert resolved_order == ['a', 'b', 'c', 'd']
+    assert resolved == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}
+    assert failed == {}
+
+
+def test_resolve_dependencies_failures():
+    item_dependencies = collections.OrderedDict([
+        # Missing dependency and an item depending on it.
+        ('a', ['missing']), ('b', ['a']),
+        # A cycle.
+        ('x', ['y']), ('y', ['x']),
+        # An item that fails to resolve and the items that depend on it.
+        ('f', []), ('g', ['f']), ('h', ['g']),
+        ('ok', []),
+        ])
+    resolved, failed, resolved_order = resolve_with_dependencies(
+        {}, item_dependencies, fail_names=('f',))
+    assert resolved == {'ok': 'OK'}
+    assert set(failed.keys()) == {'a', 'b', 'x', 'y', 'f', 'g', 'h'}
+    # Items depending on a failure are not attempted.
+    assert resolved_order == ['ok']
+
+
 if __name__ == '__main__':
     config.setup_logging(logging.DEBUG)
     test_dummy_width()
@@ -0,0 +1,68 @@
+import os
+import shutil
+from unittest import mock
+
+from slvcodec import config, math_parser, vhdl_parser
+
+vhdl_dir = os.path.join(os.path.dirname(__file__),  'vhdl')
+
+testoutput_dir = os.path.join(os.path.dirname(__file__), 'test_output')
+
+
+def test_parse_cache_directory():
+    output_dir = os.path.join(testoutput_dir, 'test_parse_cache_directory')
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    filename = os.path.join(vhdl_dir, 'vhdl_type_pkg.vhd')
+    original_directory = config.parse_cache_directory
+    config.parse_cache_directory = output_dir
+    try:
+        with mock.patch.object(
+                vhdl_parser, 'parse_file', wraps=vhdl_parser.parse_file) as parse_file:
+            first = vhdl_parser.parse_file_with_disk_cache(filename)
+            assert parse_file.call_count == 1
+            assert os.listdir(output_dir) == [
+                os.path.basename(vhdl_parser.parse_cache_filename(filename))]
+            # The second result is loaded from the cache rather than parsed again.
+            second = vhdl_parser.parse_file_with_disk_cache(filename)
+            assert parse_file.call_count == 1
+    finally:
+        config.parse_cache_directory = original_directory
+    assert second[1][0].identifier == first[1][0].identifier == 'vhdl_type_pkg'
+    assert set(second[1][0].types.keys()) == set(first[1][0].types.keys())
+
+
+def test_parse_cache_filename_depends_on_function_code():
+    filename = os.path.join(vhdl_dir, 'vhdl_type_pkg.vhd')
+    original_directory = config.parse_cache_directory
+    config.parse_cache_directory = testoutput_dir
+    math_parser.register_function('test_cache_function', lambda x: x + 1)
+    try:
+        first = vhdl_parser.parse_cache_filename(filename)
+        # Same name, module and qualified name but different code.
+        math_parser.REGISTERED_FUNCTIONS['test_cache_function'] = lambda x: x + 2
+        second = vhdl_parser.parse_cache_filename(filename)
+    finally:
+        config.parse_cache_directory = original_directory
+        del math_parser.REGISTERED_FUNCTIONS['test_cache_function']
+        math_parser.parse_string.cache_clear()
+        math_parser.parse_and_simplify.cache_clear()
+    assert first != second
+
+
+def test_parse_file_if_changed_keeps_latest_parse():
+    output_dir = os.path.join(testoutput_dir, 'test_parse_file_if_changed')
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    filename = os.path.join(output_dir, 'vhdl_type_pkg.vhd')
+    shutil.copyfile(os.path.join(vhdl_dir, 'vhdl_type_pkg.vhd'), filename)
+    first = vhdl_parser.parse_file_if_changed(filename)
+    n_cached = len(vhdl_parser._PARSE_CACHE)
+    assert vhdl_parser.parse_file_if_changed(filename)[1][0] is first[1][0]
+    with open(filename, 'a') as f:
+        f.write('\n-- An edit that changes the size of the file.\n')
+    second = vhdl_parser.parse_file_if_changed(filename)
+    assert second[1][0] is not first[1][0]
+    # The earlier parse of the file is replaced rather than kept alongside.
+    assert len(vhdl_parser._PARSE_CACHE) == n_cached